@@ -36,38 +36,118 @@ class AsmSymbolTable(dict):
 class AsmCodeEmitter(ICodeEmitter):
     """Generates binary machine code from assembly instructions"""
     
-    # Hack machine language encoding tables
-    _jump_codes = ['', 'JGT', 'JEQ', 'JGE', 'JLT', 'JNE', 'JLE', 'JMP']
-    _dest_codes = ['', 'M', 'D', 'MD', 'A', 'AM', 'AD', 'AMD']
+    # Hack machine language encoding tables (field name -> integer bits)
+    _jump_codes = {
+        '': 0b000, 'JGT': 0b001, 'JEQ': 0b010, 'JGE': 0b011,
+        'JLT': 0b100, 'JNE': 0b101, 'JLE': 0b110, 'JMP': 0b111
+    }
+    _dest_codes = {
+        '': 0b000, 'M': 0b001, 'D': 0b010, 'MD': 0b011,
+        'A': 0b100, 'AM': 0b101, 'AD': 0b110, 'AMD': 0b111
+    }
     _comp_codes = {
-        '0': '0101010', '1': '0111111', '-1':'0111010', 'D':'0001100', 'A': '0110000',
-        '!D': '0001101', '!A': '0110001', '-D': '0001111', '-A': '0110011',
-        'D+1': '0011111', 'A+1': '0110111', 'D-1': '0001110', 'A-1': '0110010',
-        'D+A': '0000010', 'D-A': '0010011', 'A-D':'0000111', 'D&A': '0000000', 'D|A': '0010101',
-        'M': '1110000', '!M': '1110001', '-M': '1110011', 'M+1': '1110111', 'M-1': '1110010',
-        'D+M': '1000010', 'M+D': '1000010', 'D-M': '1010011', 'M-D': '1000111',
-        'M&D': '1000000', 'D|M': '1010101'
+        '0': 0b0101010, '1': 0b0111111, '-1': 0b0111010, 'D': 0b0001100, 'A': 0b0110000,
+        '!D': 0b0001101, '!A': 0b0110001, '-D': 0b0001111, '-A': 0b0110011,
+        'D+1': 0b0011111, 'A+1': 0b0110111, 'D-1': 0b0001110, 'A-1': 0b0110010,
+        'D+A': 0b0000010, 'A+D': 0b0000010, 'D-A': 0b0010011, 'A-D': 0b0000111,
+        'D&A': 0b0000000, 'A&D': 0b0000000, 'D|A': 0b0010101, 'A|D': 0b0010101,
+        'M': 0b1110000, '!M': 0b1110001, '-M': 0b1110011, 'M+1': 0b1110111, 'M-1': 0b1110010,
+        'D+M': 0b1000010, 'M+D': 0b1000010, 'D-M': 0b1010011, 'M-D': 0b1000111,
+        'D&M': 0b1000000, 'M&D': 0b1000000, 'D|M': 0b1010101, 'M|D': 0b1010101
     }
 
-    def _bits(self, n):
-        """Convert number to binary string"""
-        return bin(int(n))[2:]
+    # Precomputed C-instruction prefix: 111 a cccccc dddjjj
+    _c_prefix = 0b111 << 13
+
+    def __init__(self):
+        """Initialize emitter with a cache of already encoded C-instructions"""
+        self._c_cache = {}
+
+    @staticmethod
+    def to_binary(word):
+        """
+        Format a machine word as Hack binary text
+        
+        Args:
+            word: 16-bit machine word
+            
+        Returns:
+            16-character binary string
+        """
+        return format(word, '016b')
+
+    @staticmethod
+    def to_bin(words):
+        """
+        Pack machine words into a big-endian binary image
+        
+        Args:
+            words: Sequence of 16-bit machine words
+            
+        Returns:
+            Image as bytes (2 bytes per word)
+        """
+        image = bytearray(2 * len(words))
+        for i, word in enumerate(words):
+            image[2 * i] = word >> 8
+            image[2 * i + 1] = word & 0xFF
+        return bytes(image)
+
+    @staticmethod
+    def to_intel_hex(words, base_address=0, record_size=16):
+        """
+        Encode machine words as an Intel-HEX image
+        
+        Args:
+            words: Sequence of 16-bit machine words
+            base_address: Byte address of the first word
+            record_size: Maximum number of data bytes per record
+            
+        Returns:
+            Intel-HEX text
+        """
+        def record(address, record_type, data):
+            fields = bytes([len(data), (address >> 8) & 0xFF, address & 0xFF, record_type]) + data
+            checksum = -sum(fields) & 0xFF
+            return f':{fields.hex().upper()}{checksum:02X}\n'
+
+        image = AsmCodeEmitter.to_bin(words)
+        lines = []
+        upper = None
+        offset = 0
+        while offset < len(image):
+            address = base_address + offset
+            if address >> 16 != upper:
+                upper = address >> 16
+                lines.append(record(0, 0x04, upper.to_bytes(2, 'big')))
+            # Data records must not cross a 64K segment boundary
+            length = min(record_size, len(image) - offset, 0x10000 - (address & 0xFFFF))
+            lines.append(record(address & 0xFFFF, 0x00, image[offset:offset + length]))
+            offset += length
+        lines.append(record(0, 0x01, b''))
+        return ''.join(lines)
 
     def gen_a_instruction(self, address_value):
         """
-        Generate A-instruction binary code
+        Generate A-instruction machine word
         
         Args:
             address_value: Address or constant value
             
         Returns:
-            16-bit binary string
+            16-bit machine word
+            
+        Raises:
+            ValueError: If the value does not fit the 15 bits of an A-instruction
         """
-        return '0' + self._bits(address_value).zfill(15)
+        value = int(address_value)
+        if not 0 <= value <= 0x7FFF:
+            raise ValueError(f"A-instruction value out of range (0..32767): {address_value}")
+        return value
 
     def gen_c_instruction(self, dest, comp, jump):
         """
-        Generate C-instruction binary code
+        Generate C-instruction machine word
         
         Args:
             dest: Destination field
@@ -75,12 +155,15 @@ class AsmCodeEmitter(ICodeEmitter):
             jump: Jump field
             
         Returns:
-            16-bit binary string
+            16-bit machine word
         """
-        comp_bits = self._comp_codes[comp]
-        dest_bits = self._bits(self._dest_codes.index(dest)).zfill(3)
-        jump_bits = self._bits(self._jump_codes.index(jump)).zfill(3)
-        return '111' + comp_bits + dest_bits + jump_bits
+        key = (dest, comp, jump)
+        word = self._c_cache.get(key)
+        if word is None:
+            word = (self._c_prefix | self._comp_codes[comp] << 6 |
+                    self._dest_codes[dest] << 3 | self._jump_codes[jump])
+            self._c_cache[key] = word
+        return word
 
     def emit_code(self, instruction):
         """
@@ -93,7 +176,7 @@ class AsmCodeEmitter(ICodeEmitter):
             16-bit binary machine code
         """
         if instruction[0] == '@':
-            return self.gen_a_instruction(instruction[1:])
+            return self.to_binary(self.gen_a_instruction(instruction[1:]))
         else:
             parts = instruction.split('=')
             if len(parts) == 2:
@@ -107,4 +190,4 @@ class AsmCodeEmitter(ICodeEmitter):
             else:
                 comp, jump = parts[0], ''
 
-            return self.gen_c_instruction(dest, comp, jump)
+            return self.to_binary(self.gen_c_instruction(dest, comp, jump))
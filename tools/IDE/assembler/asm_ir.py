@@ -0,0 +1,136 @@
+"""
+Assembler IR
+Compact in-memory form of Hack assembly, handed from the VM translator to the
+assembler without formatting and re-tokenizing text
+"""
+
+from functools import lru_cache
+
+# Instruction kinds
+A_INSTRUCTION = 'A'
+C_INSTRUCTION = 'C'
+L_INSTRUCTION = 'L'
+
+
+@lru_cache(maxsize=4096)
+def parse_line(line):
+    """
+    Convert one line of assembly into an IR record
+
+    The VM translator emits the same few lines over and over, so records are
+    cached per line.
+
+    Args:
+        line: Assembly source line
+
+    Returns:
+        (kind, text) tuple: (A_INSTRUCTION, symbol), (C_INSTRUCTION, 'dest=comp;jump')
+        or (L_INSTRUCTION, label); None for blank and comment lines
+    """
+    text = line.split('//')[0].strip().replace(' ', '').replace('\t', '')
+    if not text:
+        return None
+    if text[0] == '(':
+        return L_INSTRUCTION, text[1:-1]
+    if text[0] == '@':
+        return A_INSTRUCTION, text[1:]
+    return C_INSTRUCTION, text
+
+
+@lru_cache(maxsize=4096)
+def parse_snippet(snippet):
+    """
+    Convert one instruction item of VMCodeEmitter into IR records
+
+    An item is one instruction or a newline-joined snippet of them. The
+    emitter repeats the same items, so their records are cached.
+
+    Args:
+        snippet: Instruction text as listed by the emitter
+
+    Returns:
+        Tuple of (kind, text) records
+    """
+    return tuple(record for record in map(parse_line, snippet.split('\n')) if record is not None)
+
+
+def parse_text(asm_code):
+    """
+    Convert assembly text into a list of IR records
+
+    Args:
+        asm_code: Hack assembly source
+
+    Returns:
+        List of (kind, text) tuples with comments and whitespace removed
+    """
+    records = []
+    for line in asm_code.split('\n'):
+        record = parse_line(line)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def format_record(record):
+    """Format one IR record as a line of assembly"""
+    kind, text = record
+    if kind == L_INSTRUCTION:
+        return f'({text})\n'
+    if kind == A_INSTRUCTION:
+        return f'\t@{text}\n'
+    return f'\t{text}\n'
+
+
+def format_records(records):
+    """
+    Format IR records as assembly text
+
+    Args:
+        records: Iterable of (kind, text) tuples
+
+    Returns:
+        Hack assembly source
+    """
+    return ''.join(format_record(record) for record in records)
+
+
+@lru_cache(maxsize=1024)
+def split_c_instruction(text):
+    """
+    Split the text of a C-instruction into its fields
+
+    Args:
+        text: 'dest=comp;jump' without whitespace
+
+    Returns:
+        Tuple of (dest, comp, jump), missing fields as ''
+    """
+    dest, _, rest = text.rpartition('=')
+    comp, _, jump = rest.partition(';')
+    return dest, comp, jump
+
+
+class IRBuffer:
+    """Output of VMCodeEmitter collecting instructions as IR records instead of text"""
+
+    def __init__(self):
+        """Initialize empty buffer"""
+        self.records = []
+
+    def write_instructions(self, instructions):
+        """
+        Append the records of the emitter's instruction items
+
+        Args:
+            instructions: List of instruction items (see parse_snippet)
+        """
+        records = self.records
+        for instruction in instructions:
+            records.extend(parse_snippet(instruction))
+
+    def drain(self):
+        """Take the records collected so far and empty the buffer"""
+        records = self.records
+        self.records = []
+        return records
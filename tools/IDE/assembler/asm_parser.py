@@ -20,7 +20,7 @@ class AsmParser(IParser):
         Initialize parser with assembly file
         
         Args:
-            file: Path to assembly source file
+            file: Path to assembly source file or in-memory text stream
         """
         self.tokenizer = AsmTokenizer(file)
         self._init_instruction_info()
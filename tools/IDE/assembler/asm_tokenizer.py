@@ -5,6 +5,7 @@ Tokenizes Hack assembly language source code into tokens for parsing
 
 import re
 from interfaces import ITokenizer
+from sources import RecordStream, read_source
 
 
 class AsmTokenizer(ITokenizer):
@@ -29,11 +30,18 @@ class AsmTokenizer(ITokenizer):
         Initialize tokenizer with assembly file
         
         Args:
-            asm_file_name: Path to assembly source file
+            asm_file_name: Path to assembly source file or in-memory text stream
+                (a RecordStream of text chunks is tokenized chunk by chunk as it is consumed)
         """
-        with open(asm_file_name, 'r') as file:
-            self._lines = file.read()
-        self._tokens = self.tokenize(self._lines.split('\n'))
+        if isinstance(asm_file_name, RecordStream):
+            self._chunks = iter(asm_file_name)
+            self._tokens = []
+        else:
+            self._chunks = None
+            self._lines = read_source(asm_file_name)
+            self._tokens = self.tokenize(self._lines.split('\n'))
+        self._instr_pos = 0
+        self._token_pos = 0
         self.curr_instr_tokens = []
         self.curr_token = (self.ERROR, 0)
         self.curr_instruction = ''
@@ -95,7 +103,15 @@ class AsmTokenizer(ITokenizer):
 
     def has_more_instructions(self):
         """Check if there are more instructions to process"""
-        return bool(self._tokens)
+        while self._instr_pos >= len(self._tokens) and self._chunks is not None:
+            # Streamed input: replace the consumed instructions by the next chunk
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._chunks = None
+                break
+            self._tokens = self.tokenize(chunk.split('\n'))
+            self._instr_pos = 0
+        return self._instr_pos < len(self._tokens)
 
     def next_instruction(self):
         """
@@ -104,14 +120,16 @@ class AsmTokenizer(ITokenizer):
         Returns:
             List of tokens for the instruction
         """
-        self.curr_instr_tokens = self._tokens.pop(0)
+        self.curr_instr_tokens = self._tokens[self._instr_pos]
+        self._instr_pos += 1
+        self._token_pos = 0
         self.curr_instruction = ' '.join(token[1] for token in self.curr_instr_tokens)
         self.next_token()
         return self.curr_instr_tokens
 
     def has_next_token(self):
         """Check if there are more tokens in current instruction"""
-        return bool(self.curr_instr_tokens)
+        return self._token_pos < len(self.curr_instr_tokens)
 
     def next_token(self):
         """
@@ -121,7 +139,8 @@ class AsmTokenizer(ITokenizer):
             Current token tuple (type, value)
         """
         if self.has_next_token():
-            self.curr_token = self.curr_instr_tokens.pop(0)
+            self.curr_token = self.curr_instr_tokens[self._token_pos]
+            self._token_pos += 1
         else:
             self.curr_token = (self.ERROR, 0)
         return self.curr_token
@@ -134,6 +153,6 @@ class AsmTokenizer(ITokenizer):
             Next token tuple (type, value)
         """
         if self.has_next_token():
-            return self.curr_instr_tokens[0]
+            return self.curr_instr_tokens[self._token_pos]
         else:
             return (self.ERROR, 0)
@@ -1,27 +1,55 @@
 """
 Assembler Translator
-Two-pass assembler that translates Hack assembly to machine code
+Two-pass (or single-pass with backpatching) assembler that translates
+Hack assembly to machine code
 """
 
 import os
 import io
 from assembler.asm_parser import AsmParser
 from assembler.asm_code_emitter import AsmSymbolTable, AsmCodeEmitter
+from assembler import asm_ir
+from sources import RecordStream, in_memory, read_source, source_name
 
 
 class AsmTranslator():
-    """Two-pass assembler translator"""
+    """Two-pass or single-pass assembler translator"""
     
-    def __init__(self, filepath):
+    # Supported output formats
+    OUTPUT_FORMATS = ('hack', 'bin', 'hex')
+
+    # Default SPI flash address of the program image read by the bootloader
+    FLASH_ADDRESS = 0x010000
+
+    def __init__(self, filepath, single_pass=False, output_format='hack', hex_address=FLASH_ADDRESS,
+                 listing_path=None):
         """
         Initialize translator with assembly file
         
         Args:
-            filepath: Path to assembly source file
+            filepath: Path to assembly source file, in-memory text stream, RecordStream of
+                assembler IR records (see assembler.asm_ir) or RecordStream of text chunks
+            single_pass: Tokenize the source once and backpatch forward label references
+            output_format: 'hack' (binary text), 'bin' (packed big-endian) or 'hex' (Intel-HEX)
+            hex_address: Load address of the Intel-HEX image
+            listing_path: Optional path of an address/hex/source listing (.lst) to write
         """
+        if output_format not in self.OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
         self.filepath = filepath
+        self.single_pass = single_pass
+        self.output_format = output_format
+        self.hex_address = hex_address
+        self.listing_path = listing_path
+        self.words = []
         self.symbol_address = 16
         self.symbols_table = AsmSymbolTable()
+        self.labels = set()
+
+    @staticmethod
+    def _is_ir(source):
+        """Check if a source is a RecordStream of assembler IR records (not of text chunks)"""
+        return isinstance(source, RecordStream) and source.format_record is not None
 
     def _get_address(self, symbol):
         """
@@ -41,17 +69,27 @@ class AsmTranslator():
                 self.symbol_address += 1
             return self.symbols_table.get_address(symbol)
 
+    def _records(self):
+        """
+        Classify the lines of the source as assembler IR records
+        
+        Each line is split into its kind and text once, through the per-line
+        cache of asm_ir.parse_line, instead of matching every word.
+        
+        Returns:
+            List of (kind, text) records
+        """
+        return asm_ir.parse_text(read_source(self.filepath))
+
     def pass_1(self):
         """First pass: build symbol table with label addresses"""
-        parser = AsmParser(self.filepath)
         curr_address = 0
-        while parser.has_more_instructions():
-            parser.advance()
-            inst_type = parser.instruction_type
-            if inst_type in [parser.A_INSTRUCTION, parser.C_INSTRUCTION]:
+        for kind, text in self._records():
+            if kind == asm_ir.L_INSTRUCTION:
+                self.symbols_table.add_entry(text, curr_address)
+                self.labels.add(text)
+            else:
                 curr_address += 1
-            elif inst_type == parser.L_INSTRUCTION:
-                self.symbols_table.add_entry(parser.symbol, curr_address)
 
     def pass_2(self):
         """
@@ -61,36 +99,208 @@ class AsmTranslator():
             Machine code as string
         """
         hack_output = io.StringIO()
-        hex_output = io.StringIO()
-        parser = AsmParser(self.filepath)
+        hex_output = io.StringIO() if self.listing_path else None
         writer = AsmCodeEmitter()
+        split_c_instruction = asm_ir.split_c_instruction
+        
+        for kind, text in self._records():
+            if kind == asm_ir.C_INSTRUCTION:
+                word = writer.gen_c_instruction(*split_c_instruction(text))
+            elif kind == asm_ir.A_INSTRUCTION:
+                word = writer.gen_a_instruction(self._get_address(text))
+            else:
+                if hex_output:
+                    hex_output.write(self._listing_label(text))
+                continue
+            binary_code = writer.to_binary(word)
+            hack_output.write(binary_code + '\n')
+            if hex_output:
+                assembly_instruction = text if kind == asm_ir.C_INSTRUCTION else '@' + text
+                hex_output.write(self._listing_line(len(self.words), binary_code, word, assembly_instruction))
+            self.words.append(word)
         
+        if hex_output:
+            self._write_listing(hex_output.getvalue())
+            hex_output.close()
+        hack_code = hack_output.getvalue()
+        hack_output.close()
+        return hack_code
+
+    def single_pass_assemble(self):
+        """
+        Single pass: generate machine code, backpatching forward references
+
+        Symbolic A-instructions are emitted as placeholders and recorded in a
+        fixup list. Once all labels have been seen, fixups are resolved in source
+        order, so variables get the same addresses (and duplicate labels the same
+        last-definition-wins value) as in the two-pass path.
+
+        Returns:
+            Machine code as string
+        """
+        self._single_pass()
+        return ''.join(AsmCodeEmitter.to_binary(word) + '\n' for word in self.words)
+
+    def _single_pass(self):
+        """Encode all instructions into self.words, backpatching symbolic A-instructions"""
+        code = []
+        fixups = []
+        sources = [] if self.listing_path else None
+        parser = AsmParser(self.filepath)
+        writer = AsmCodeEmitter()
+        curr_address = 0
+
         while parser.has_more_instructions():
             parser.advance()
             inst_type = parser.instruction_type
-            assembly_instruction = parser.tokenizer.curr_instruction.strip().replace(" ", "")
+            if sources is not None and inst_type != parser.L_INSTRUCTION:
+                sources.append((curr_address, parser.tokenizer.curr_instruction.strip().replace(" ", "")))
             if inst_type == parser.A_INSTRUCTION:
-                binary_code = writer.gen_a_instruction(self._get_address(parser.symbol))
+                if parser.symbol.isdigit():
+                    code.append(writer.gen_a_instruction(parser.symbol))
+                else:
+                    fixups.append((curr_address, parser.symbol))
+                    code.append(None)
+                curr_address += 1
             elif inst_type == parser.C_INSTRUCTION:
-                binary_code = writer.gen_c_instruction(parser.dest, parser.comp, parser.jmp)
+                code.append(writer.gen_c_instruction(parser.dest, parser.comp, parser.jmp))
+                curr_address += 1
             elif inst_type == parser.L_INSTRUCTION:
-                continue
+                self.symbols_table.add_entry(parser.symbol, curr_address)
+                self.labels.add(parser.symbol)
+                if sources is not None:
+                    sources.append((None, parser.symbol))
+
+        self._resolve(writer, code, fixups)
+        if sources is not None:
+            self._write_listing(''.join(
+                self._listing_label(source) if address is None else
+                self._listing_line(address, writer.to_binary(code[address]), code[address], source)
+                for address, source in sources
+            ))
+
+    def _single_pass_ir(self):
+        """
+        Encode the assembler IR records of a RecordStream source into self.words
+
+        The records come straight from the VM translator: A-instructions carry
+        their symbol and C-instructions their 'dest=comp;jump' text, so no
+        assembly text is tokenized. Symbols are backpatched like in _single_pass.
+        """
+        code = []
+        fixups = []
+        writer = AsmCodeEmitter()
+        split_c_instruction = asm_ir.split_c_instruction
+        for kind, text in self.filepath:
+            if kind == asm_ir.C_INSTRUCTION:
+                code.append(writer.gen_c_instruction(*split_c_instruction(text)))
+            elif kind == asm_ir.A_INSTRUCTION:
+                if text.isdigit():
+                    code.append(writer.gen_a_instruction(text))
+                else:
+                    fixups.append((len(code), text))
+                    code.append(None)
             else:
-                continue
-            hack_output.write(binary_code + '\n')
-            hex_output.write(f'{binary_code} {int(binary_code, 2):04X} {assembly_instruction}\n')
+                self.symbols_table.add_entry(text, len(code))
+                self.labels.add(text)
+        self._resolve(writer, code, fixups)
+
+    def _resolve(self, writer, code, fixups):
+        """
+        Backpatch symbolic A-instructions in source order and keep the words
+
+        Args:
+            writer: AsmCodeEmitter encoding the instructions
+            code: Machine words, None for symbolic A-instructions
+            fixups: List of (address, symbol) of the symbolic A-instructions
+        """
+        for address, symbol in fixups:
+            code[address] = writer.gen_a_instruction(self._get_address(symbol))
+        self.words = code
+
+    @staticmethod
+    def _listing_line(address, binary_code, word, source):
+        """Format one instruction of the listing: ROM address, binary, hex, source"""
+        return f'{address:04X}  {binary_code} {word:04X}  {source}\n'
+
+    @staticmethod
+    def _listing_label(label):
+        """Format a label line of the listing"""
+        return f'{"":29}({label})\n'
+
+    def _write_listing(self, body):
+        """
+        Write the listing file with the resolved symbol table appended
         
-        hack_code = hack_output.getvalue()
-        hack_output.close()
-        hex_output.close()
-        return hack_code
+        Args:
+            body: Formatted instruction lines
+        """
+        predefined = AsmSymbolTable()
+        symbols = sorted(
+            (address, symbol) for symbol, address in self.symbols_table.items()
+            if symbol not in predefined
+        )
+        with open(self.listing_path, 'w') as f:
+            f.write(f'// Listing of {os.path.basename(source_name(self.filepath))}\n')
+            f.write('// ROM   BINARY           HEX   SOURCE\n')
+            f.write(body)
+            f.write('\n// Symbol table\n')
+            f.write('// ADDR  KIND      SYMBOL\n')
+            for address, symbol in symbols:
+                kind = 'label' if symbol in self.labels else 'variable'
+                f.write(f'{int(address):04X}    {kind:<9} {symbol}\n')
+
+    def assemble_stream(self, chunk_size=256):
+        """
+        Assemble a streamed source in a single pass
+        
+        Assembler IR records (or text chunks) are encoded while the previous
+        step is still producing them; only one machine word (or pending symbol) per
+        instruction is kept. Symbols can only be resolved once the last label
+        has been seen (a later duplicate label wins), so the words are handed
+        on after the source has ended.
+        
+        Args:
+            chunk_size: Number of machine words per yielded 'hack' text chunk
+            
+        Yields:
+            Machine code chunks (text, or bytes for the 'bin' output format)
+        """
+        if self._is_ir(self.filepath):
+            self._single_pass_ir()
+        else:
+            self._single_pass()
+        if self.output_format == 'bin':
+            yield AsmCodeEmitter.to_bin(self.words)
+        elif self.output_format == 'hex':
+            yield AsmCodeEmitter.to_intel_hex(self.words, self.hex_address)
+        else:
+            for start in range(0, len(self.words), chunk_size):
+                yield ''.join(AsmCodeEmitter.to_binary(word) + '\n' for word in self.words[start:start + chunk_size])
 
     def assemble(self):
         """
-        Perform two-pass assembly
+        Perform two-pass (or single-pass) assembly
         
         Returns:
-            Machine code as string
+            Machine code as string, or bytes for the 'bin' output format
         """
-        self.pass_1()
-        return self.pass_2()
+        source = self.filepath
+        if isinstance(source, RecordStream) and (self.listing_path if self._is_ir(source) else not self.single_pass):
+            # The listing shows the assembly text, and two passes read the source twice
+            self.filepath = in_memory(source.read(), source.name)
+        if self._is_ir(self.filepath):
+            # IR records are already split into fields: encode them in one pass
+            self._single_pass_ir()
+            hack_code = ''.join(AsmCodeEmitter.to_binary(word) + '\n' for word in self.words)
+        elif self.single_pass:
+            hack_code = self.single_pass_assemble()
+        else:
+            self.pass_1()
+            hack_code = self.pass_2()
+
+        if self.output_format == 'bin':
+            return AsmCodeEmitter.to_bin(self.words)
+        elif self.output_format == 'hex':
+            return AsmCodeEmitter.to_intel_hex(self.words, self.hex_address)
+        return hack_code
@@ -0,0 +1,411 @@
+"""
+Nand2Tetris IDE - Benchmarks
+Times the toolchain stages on generated inputs of increasing size
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from assembler import asm_ir
+from assembler.asm_translator import AsmTranslator
+from compiler.jack_tokenizer import JackTokenizer
+from compiler.jack_translator import JackTranslator
+from vm_translator.vm_translator import VMTranslator
+from vm_translator.vm_parser import VMParser
+from vm_translator.vm_constants import C_PUSH, C_POP, C_FUNCTION, C_CALL
+from emulator.hack_cpu import HackIO
+from emulator.hack_jit import HackBlockCPU
+from sources import RecordStream, in_memory
+
+
+def generate_asm(instruction_count):
+    """
+    Generate a synthetic Hack assembly program
+
+    Args:
+        instruction_count: Approximate number of instructions to generate
+
+    Returns:
+        Assembly source as string
+    """
+    block = [
+        '({label})',
+        '\t@SP', '\tAM=M-1', '\tD=M',
+        '\t@var{var}', '\tM=D+M',
+        '\t@{label}', '\tD;JGT',
+    ]
+    lines = []
+    for i in range(max(1, instruction_count // 7)):
+        lines.extend(line.format(label=f'L{i}', var=i % 64) for line in block)
+    return '\n'.join(lines) + '\n'
+
+
+def generate_vm(command_count):
+    """
+    Generate a synthetic VM program
+
+    Args:
+        command_count: Approximate number of commands to generate
+
+    Returns:
+        VM source as string
+    """
+    block = [
+        'function Bench.f{i} 2',
+        'push argument 0  // x',
+        'push constant {i}',
+        'add',
+        'pop local 1',
+        'label LOOP_{i}',
+        'push local 1',
+        'if-goto LOOP_{i}',
+        'call Bench.f{i} 1',
+        'return',
+    ]
+    lines = []
+    for i in range(max(1, command_count // len(block))):
+        lines.extend(line.format(i=i) for line in block)
+    return '\n'.join(lines) + '\n'
+
+
+def generate_jack(symbol_count):
+    """
+    Generate a synthetic Jack class with many symbols
+
+    Args:
+        symbol_count: Number of fields plus locals to declare (each one is also used)
+
+    Returns:
+        Jack source as string
+    """
+    count = max(1, symbol_count // 2)
+    lines = ['class Bench {']
+    lines.extend(f'    field int f{i};' for i in range(count))
+    lines.append('    method int run() {')
+    lines.extend(f'        var int v{i};' for i in range(count))
+    lines.extend(f'        let v{i} = f{i} + v{(i + 1) % count};' for i in range(count))
+    lines.append('        return v0;')
+    lines.append('    }')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def bench_tokenizer(sizes):
+    """
+    Time tokenization of generated Jack classes of the given sizes
+
+    Args:
+        sizes: Iterable of symbol counts (see generate_jack)
+
+    Returns:
+        List of (token_count, seconds) tuples
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            jack_file = os.path.join(tmp_dir, 'Bench.jack')
+            with open(jack_file, 'w') as f:
+                f.write(generate_jack(size))
+            start = time.perf_counter()
+            tokenizer = JackTokenizer(jack_file)
+            count = 0
+            while tokenizer.hasMoreTokens():
+                tokenizer.peekNextToken()
+                tokenizer.advance()
+                count += 1
+            results.append((count, time.perf_counter() - start))
+    return results
+
+
+def bench_compiler(sizes):
+    """
+    Time compilation of generated Jack classes of the given sizes
+
+    Args:
+        sizes: Iterable of symbol counts
+
+    Returns:
+        List of (symbol_count, seconds) tuples
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            jack_file = os.path.join(tmp_dir, 'Bench.jack')
+            with open(jack_file, 'w') as f:
+                f.write(generate_jack(size))
+            start = time.perf_counter()
+            JackTranslator(jack_file).compile()
+            results.append((size, time.perf_counter() - start))
+    return results
+
+
+def bench_vm_parser(sizes):
+    """
+    Time parsing of generated VM programs of the given sizes
+
+    Args:
+        sizes: Iterable of command counts
+
+    Returns:
+        List of (command_count, seconds) tuples
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            vm_file = os.path.join(tmp_dir, f'bench_{size}.vm')
+            with open(vm_file, 'w') as f:
+                f.write(generate_vm(size))
+            start = time.perf_counter()
+            parser = VMParser(vm_file)
+            while parser.advance():
+                if parser.command_type() in (C_PUSH, C_POP, C_FUNCTION, C_CALL):
+                    parser.arg2()
+                parser.arg1()
+            results.append((size, time.perf_counter() - start))
+    return results
+
+
+def bench_assembler(sizes, single_pass=False):
+    """
+    Time assembly of generated programs of the given sizes
+
+    Args:
+        sizes: Iterable of instruction counts
+        single_pass: Use the single-pass assembler
+
+    Returns:
+        List of (instruction_count, seconds) tuples
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            asm_file = os.path.join(tmp_dir, f'bench_{size}.asm')
+            with open(asm_file, 'w') as f:
+                f.write(generate_asm(size))
+            start = time.perf_counter()
+            AsmTranslator(asm_file, single_pass=single_pass).assemble()
+            results.append((size, time.perf_counter() - start))
+    return results
+
+
+def bench_vm_to_hack(sizes, ir=False):
+    """
+    Time translation and assembly of generated VM programs of the given sizes
+
+    Args:
+        sizes: Iterable of command counts
+        ir: Hand assembler IR records to the assembler instead of assembly text
+
+    Returns:
+        List of (command_count, seconds) tuples
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            vm_file = os.path.join(tmp_dir, f'Bench{size}.vm')
+            with open(vm_file, 'w') as f:
+                f.write(generate_vm(size))
+            start = time.perf_counter()
+            translator = VMTranslator(vm_file)
+            if ir:
+                asm_input = RecordStream('Bench.asm', translator.translate_ir(), asm_ir.format_record)
+            else:
+                asm_input = in_memory(translator.translate(), 'Bench.asm')
+            AsmTranslator(asm_input).assemble()
+            results.append((size, time.perf_counter() - start))
+    return results
+
+
+# Jack sources of the cycle benchmarks
+JACK_SYSTEM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               '..', '..', 'fpga', 'designs', 'Hack', 'programs', 'jack', 'system')
+
+# Minimal Math class for the generated programs (the board library has none)
+MATH_JACK = """
+class Math {
+    function int multiply(int x, int y) {
+        var int sum, bit;
+        let sum = 0;
+        let bit = 1;
+        while (~(bit = 0)) {
+            if (~((y & bit) = 0)) { let sum = sum + x; }
+            let x = x + x;
+            let bit = bit + bit;
+        }
+        return sum;
+    }
+
+    function int divide(int x, int y) {
+        var int q;
+        let q = 0;
+        while (~(x < y)) { let x = x - y; let q = q + 1; }
+        return q;
+    }
+}
+"""
+
+
+def generate_cycle_programs(iterations):
+    """
+    Generate the Jack programs of the cycle benchmarks
+
+    Every program ends by calling Bench.done(result), where the run is stopped.
+
+    Args:
+        iterations: Loop count of the arithmetic program
+
+    Returns:
+        Dictionary of program name to {class name: Jack source}
+    """
+    with open(os.path.join(JACK_SYSTEM_DIR, 'Screen.jack')) as f:
+        screen = f.read()
+    with open(os.path.join(JACK_SYSTEM_DIR, 'Mem.jack')) as f:
+        mem = f.read()
+    arithmetic = """
+class Bench {
+    function int run(int n) {
+        var int i, sum, x;
+        let i = 0;
+        let sum = 0;
+        while (i < n) {
+            let x = (i * 4) + (3 * 8) - (8 / 4);
+            let sum = sum + (x * 2) + (~0 & 255);
+            if (true) { let sum = sum - 1; }
+            let i = i + 1;
+        }
+        return sum;
+    }
+
+    function void done(int result) { return; }
+}
+"""
+    return {
+        'arithmetic': {
+            'Sys': f'class Sys {{ function void init() {{ do Bench.done(Bench.run({iterations})); return; }} }}',
+            'Bench': arithmetic,
+            'Math': MATH_JACK,
+        },
+        'Screen.fillScreen': {
+            'Sys': 'class Sys { function void init() { do Screen.fillScreen(0); do Bench.done(0); return; } }',
+            'Bench': 'class Bench { function void done(int result) { return; } }',
+            'Screen': screen,
+            'Mem': mem,
+        },
+    }
+
+
+def build_program(sources, fold_constants=False, **translate_options):
+    """
+    Compile, translate and assemble a Jack program in memory
+
+    Args:
+        sources: Dictionary of class name to Jack source
+        fold_constants: Fold constant expressions in the compiler
+        translate_options: VMTranslator keyword options
+
+    Returns:
+        AsmTranslator holding the machine words and the symbol table
+    """
+    vm_files = []
+    for name, source in sources.items():
+        vm_code = JackTranslator(in_memory(source, f'{name}.jack'), fold_constants).compile()
+        vm_files.append(in_memory(vm_code, f'{name}.vm'))
+    records = VMTranslator(vm_files, **translate_options).translate_ir()
+    assembler = AsmTranslator(RecordStream('Bench.asm', records, asm_ir.format_record))
+    assembler.assemble()
+    return assembler
+
+
+def run_cycles(assembler, max_cycles=100000000):
+    """
+    Run an assembled benchmark program until it calls Bench.done
+
+    The entry of Bench.done is patched into an '@X; 0;JMP' self-loop, which
+    the emulator treats as the end of the program.
+
+    Returns:
+        Tuple of (cycles, result passed to Bench.done)
+    """
+    done = int(assembler.symbols_table.get_address('Bench.done'))
+    rom = list(assembler.words)
+    rom[done] = done
+    rom[done + 1] = 0b1110101010000111
+    cpu = HackBlockCPU(rom, HackIO())
+    cpu.run(max_cycles)
+    # ARG points at the argument of Bench.done
+    return cpu.cycles, cpu.ram[cpu.ram[2]]
+
+
+def bench_cycles(iterations, variants):
+    """
+    Count the CPU cycles of the benchmark programs built with different options
+
+    Args:
+        iterations: Loop count of the arithmetic program
+        variants: Dictionary of variant name to build_program keyword options
+
+    Returns:
+        List of (program, variant, instruction_count, cycles, result) tuples
+    """
+    results = []
+    for program, sources in generate_cycle_programs(iterations).items():
+        for variant, options in variants.items():
+            assembler = build_program(sources, **options)
+            cycles, result = run_cycles(assembler)
+            results.append((program, variant, len(assembler.words), cycles, result))
+    return results
+
+
+def report_cycles(results):
+    """Print cycle benchmark results"""
+    print("CPU cycles (program, variant, ROM words, cycles, result)")
+    for program, variant, size, cycles, result in results:
+        print(f'  {program:<18} {variant:<16} {size:>6} {cycles:>10}  {result}')
+
+
+def report(title, results):
+    """Print benchmark results with per-item cost"""
+    print(title)
+    for size, seconds in results:
+        print(f'  {size:>9}  {seconds:9.3f}s  {seconds / size * 1e6:8.2f} us/item')
+
+
+def main():
+    """Run the requested benchmarks"""
+    parser = argparse.ArgumentParser(description="nand2tetris toolchain benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="Comma-separated list of input sizes")
+    parser.add_argument("--stages", default="assembler,vm_parser",
+                        help="Comma-separated list of stages to benchmark (assembler, vm_parser, vm_to_hack, tokenizer, compiler, cycles)")
+    parser.add_argument("--single-pass", action="store_true", help="Benchmark the single-pass assembler")
+    parser.add_argument("--iterations", type=int, default=1000, help="Loop count of the cycle benchmark")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    stages = args.stages.split(',')
+    if 'assembler' in stages:
+        report("Assembler (instructions)", bench_assembler(sizes, args.single_pass))
+    if 'vm_parser' in stages:
+        report("VM parser (commands)", bench_vm_parser(sizes))
+    if 'tokenizer' in stages:
+        report("Jack tokenizer (tokens)", bench_tokenizer(sizes))
+    if 'compiler' in stages:
+        report("Jack compiler (symbols)", bench_compiler(sizes))
+    if 'vm_to_hack' in stages:
+        report("VM -> Hack via assembly text (commands)", bench_vm_to_hack(sizes))
+        report("VM -> Hack via assembler IR (commands)", bench_vm_to_hack(sizes, ir=True))
+    if 'cycles' in stages:
+        report_cycles(bench_cycles(args.iterations, {
+            'baseline': {},
+            'fold-constants': {'fold_constants': True},
+            'inline-constants': {'fold_constants': True, 'inline_constants': True},
+            'cache-top': {'cache_top': True},
+            'fuse-branches': {'fold_constants': True, 'inline_constants': True, 'fuse_branches': True},
+            'all': {'fold_constants': True, 'inline_constants': True, 'fuse_branches': True,
+                    'cache_top': True},
+        }))
+
+
+if __name__ == "__main__":
+    main()
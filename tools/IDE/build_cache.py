@@ -0,0 +1,135 @@
+"""
+Nand2Tetris IDE - Build Cache
+Serves step outputs from a content-addressed cache keyed by input contents,
+step options and the toolchain version
+"""
+
+import hashlib
+import os
+from sources import read_source, source_name
+
+
+def tool_version():
+    """
+    Hash the toolchain sources
+
+    Any change to the Python sources of the IDE changes the version, so cached
+    outputs of older tool code are never served.
+
+    Returns:
+        Hex digest of all .py files below this directory
+    """
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith(('.', '__')))
+        for name in sorted(filenames):
+            if name.endswith('.py'):
+                path = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """Content-hash cache of compile/translate/assemble outputs"""
+
+    def __init__(self, cache_dir):
+        """
+        Initialize cache in a directory (created on first write)
+
+        Args:
+            cache_dir: Cache directory, e.g. programs/build/.cache
+        """
+        self.cache_dir = cache_dir
+        self.version = tool_version()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, step, filepaths, options=None):
+        """
+        Compute the cache key of a step run
+
+        Args:
+            step: Step name
+            filepaths: Input file paths or in-memory streams, in the order the step reads them
+            options: Dictionary of step options that change the output
+
+        Returns:
+            Hex digest key
+        """
+        digest = hashlib.sha256()
+        digest.update(f'{self.version}\0{step}\0{sorted((options or {}).items())!r}\0'.encode())
+        for filepath in filepaths:
+            # Statics and labels are named after the file, so the name is part of the input
+            digest.update(f'{os.path.basename(source_name(filepath))}\0'.encode())
+            digest.update(hashlib.sha256(read_source(filepath, binary=True)).digest())
+        return digest.hexdigest()
+
+    def _path(self, key, binary):
+        """Get the cache file path of a key"""
+        return os.path.join(self.cache_dir, key + ('.bin' if binary else '.txt'))
+
+    def get(self, key):
+        """
+        Look up a cached output
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached text or bytes, None if not cached
+        """
+        for binary in (False, True):
+            path = self._path(key, binary)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                self.hits += 1
+                return data if binary else data.decode('utf-8')
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """
+        Store an output
+
+        Args:
+            key: Cache key
+            data: Output text or bytes
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        binary = isinstance(data, bytes)
+        path = self._path(key, binary)
+        # Write then rename, so concurrent builds never read a partial entry
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data if binary else data.encode('utf-8'))
+        os.replace(temp_path, path)
+
+    def fetch(self, step, filepaths, options, build):
+        """
+        Get a step output from the cache, or build and store it
+
+        Args:
+            step: Step name
+            filepaths: Input file paths
+            options: Dictionary of step options that change the output
+            build: Function producing the output on a cache miss
+
+        Returns:
+            Step output
+        """
+        key = self.key(step, filepaths, options)
+        data = self.get(key)
+        if data is not None:
+            return data
+        data = build()
+        if data is not None:
+            self.put(key, data)
+        return data
+
+    def report(self):
+        """Get a summary of cache use"""
+        return f'build cache: {self.hits} hits, {self.misses} misses'
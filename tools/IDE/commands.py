@@ -1,43 +1,119 @@
 """
 Nand2Tetris IDE - Command Pattern Implementation
 Defines abstract Command interface and concrete command implementations
-for compile, translate, and assemble operations
+for compile, translate, assemble, and run operations
 """
 
+import os
 from abc import ABC, abstractmethod
 from compiler.jack_translator import JackTranslator
 from vm_translator.vm_translator import VMTranslator
 from assembler.asm_translator import AsmTranslator
+from emulator.hack_emulator import HackEmulator
+from sources import RecordStream, in_memory, is_stream, output_name, source_name
+from vm_translator.vm_parser import VMParser
+from assembler import asm_ir
 
 
 class Command(ABC):
     """Abstract base class for command pattern"""
     
+    # Step name and extension of the output file
+    name = ''
+    extension = '.out'
+    # BuildCache serving unchanged outputs, None to always rebuild
+    cache = None
+    # Whether the command takes assembler IR records from the previous step,
+    # and whether it hands them to the next one (set by CommandExecutor)
+    accepts_ir = False
+    hand_over_ir = False
+    
     @abstractmethod
     def execute(self, input_data):
         """
         Execute the command with given input data
         
         Args:
-            input_data: Input file or data to process
+            input_data: Input file path or in-memory stream to process
             
         Returns:
             Processed output
         """
         pass
 
+    def stream(self, input_data):
+        """
+        Execute the command as a step of a streaming pipeline
+        
+        Commands that cannot stream, or that are served from a build cache,
+        run on their whole input (a RecordStream is read completely) and hand
+        on their output as an in-memory stream.
+        
+        Args:
+            input_data: Input file path, in-memory stream or RecordStream
+            
+        Returns:
+            Output as RecordStream or in-memory stream (or list of them)
+        """
+        output = self.execute(self.materialize(input_data))
+        if isinstance(output, (str, bytes)):
+            return in_memory(output, output_name(input_data, self.extension))
+        return output
+
+    @staticmethod
+    def materialize(input_data):
+        """
+        Read RecordStream inputs into in-memory streams
+        
+        A RecordStream can only be consumed once, but a command running on its
+        whole input may read it more than once (e.g. for a build cache key).
+        
+        Args:
+            input_data: Input file path, stream, RecordStream or list of them
+            
+        Returns:
+            Input with every RecordStream replaced by an in-memory stream
+        """
+        if isinstance(input_data, list):
+            return [Command.materialize(item) for item in input_data]
+        if isinstance(input_data, RecordStream):
+            return in_memory(input_data.read(), input_data.name)
+        return input_data
+
+    def report(self):
+        """Get a summary of the last run (empty if the command has nothing to report)"""
+        return ''
+
+    def cached(self, step, filepaths, options, build):
+        """
+        Get a step output from the build cache, or build it
+        
+        Args:
+            step: Step name
+            filepaths: Input file paths the output depends on
+            options: Dictionary of options that change the output
+            build: Function producing the output
+            
+        Returns:
+            Step output
+        """
+        if self.cache is None:
+            return build()
+        return self.cache.fetch(step, filepaths, options, build)
+
 
 class ToolFactory:
     """Factory class for creating translator/compiler/assembler instances"""
     
     @staticmethod
-    def create_tool(tool_type, input_file):
+    def create_tool(tool_type, input_file, **options):
         """
         Create appropriate tool instance based on type
         
         Args:
-            tool_type: Type of tool ("compile", "translate", "assemble")
+            tool_type: Type of tool ("compile", "translate", "assemble", "run", "run_batch")
             input_file: Input file path
+            options: Tool-specific keyword options
             
         Returns:
             Tool instance
@@ -46,11 +122,17 @@ class ToolFactory:
             ValueError: If tool_type is unknown
         """
         if tool_type == "compile":
-            return JackTranslator(input_file)
+            return JackTranslator(input_file, **options)
         elif tool_type == "translate":
-            return VMTranslator(input_file)
+            return VMTranslator(input_file, **options)
         elif tool_type == "assemble":
-            return AsmTranslator(input_file)
+            return AsmTranslator(input_file, **options)
+        elif tool_type == "run":
+            return HackEmulator(input_file, **options)
+        elif tool_type == "run_batch":
+            # The batch emulator needs NumPy, so it is only imported when used
+            from emulator.hack_batch import HackBatchEmulator
+            return HackBatchEmulator(input_file, **options)
         else:
             raise ValueError("Unknown tool type")
 
@@ -58,25 +140,218 @@ class ToolFactory:
 class CompileCommand(Command):
     """Command for compiling Jack to VM code"""
     
+    name = "compile"
+    extension = ".vm"
+    
+    def __init__(self, jobs=1, fold_constants=False, cache=None):
+        """
+        Initialize compile command
+        
+        Args:
+            jobs: Number of worker processes for multi-file input (0 uses every CPU core)
+            fold_constants: Fold constant expressions and strength-reduce multiplications
+            cache: Optional BuildCache
+        """
+        self.jobs = jobs or os.cpu_count()
+        self.fold_constants = fold_constants
+        self.cache = cache
+    
     def execute(self, input_data):
-        """Execute compilation"""
-        compiler = ToolFactory.create_tool("compile", input_data)
-        return compiler.compile()
+        """
+        Execute compilation
+        
+        A single Jack file is compiled to VM code. A directory, glob pattern or
+        list of files is compiled class by class into a list of in-memory .vm
+        streams, each named after its .jack file.
+        """
+        filepaths = JackTranslator.collect_files(input_data)
+        options = {'fold_constants': self.fold_constants}
+        if filepaths == [input_data]:
+            return self.cached("compile", filepaths, options,
+                               lambda: ToolFactory.create_tool("compile", input_data, **options).compile())
+        # Only the classes missing from the cache are compiled
+        vm_codes = {}
+        keys = {}
+        if self.cache is not None:
+            for filepath in filepaths:
+                keys[filepath] = self.cache.key("compile", [filepath], options)
+                vm_code = self.cache.get(keys[filepath])
+                if vm_code is not None:
+                    vm_codes[filepath] = vm_code
+        missing = [filepath for filepath in filepaths if filepath not in vm_codes]
+        for filepath, vm_code in JackTranslator.compile_files(missing, self.jobs, self.fold_constants).items():
+            if self.cache is not None and vm_code is not None:
+                self.cache.put(keys[filepath], vm_code)
+            vm_codes[filepath] = vm_code
+        return [in_memory(vm_codes[filepath], os.path.splitext(filepath)[0] + self.extension)
+                for filepath in filepaths]
+
+    def stream(self, input_data):
+        """
+        Compile to VM command records, produced while each class is parsed
+        
+        Classes are compiled one after another as the next step consumes
+        them; worker processes are not used. With a build cache the classes
+        are compiled (or served from the cache) before being handed on.
+        """
+        if self.cache is not None:
+            return super().stream(input_data)
+        filepaths = JackTranslator.collect_files(input_data)
+        streams = [
+            RecordStream(os.path.splitext(source_name(filepath))[0] + self.extension,
+                         ToolFactory.create_tool("compile", filepath, fold_constants=self.fold_constants).compile_stream(),
+                         VMParser.format)
+            for filepath in filepaths
+        ]
+        return streams[0] if filepaths == [input_data] else streams
 
 
 class TranslateCommand(Command):
     """Command for translating VM code to assembly"""
     
+    name = "translate"
+    extension = ".asm"
+    
+    def __init__(self, optimize=False, shared_calls=False, shared_compares=False, inline_constants=False,
+                 fuse_branches=False, cache_top=False, cache=None):
+        """
+        Initialize translate command
+        
+        Args:
+            optimize: Run the peephole optimizer over the emitted assembly
+            shared_calls: Emit calls and returns through global $$CALL/$$RETURN routines
+            shared_compares: Emit eq/gt/lt through one global routine per operator
+            inline_constants: Apply constant operands of add/sub/and/or/eq/gt/lt in place
+            fuse_branches: Jump on compared operands instead of a materialized eq/gt/lt result
+            cache_top: Keep the top of the VM stack in D within basic blocks
+            cache: Optional BuildCache
+        """
+        self.optimize = optimize
+        self.shared_calls = shared_calls
+        self.shared_compares = shared_compares
+        self.inline_constants = inline_constants
+        self.fuse_branches = fuse_branches
+        self.cache_top = cache_top
+        self.cache = cache
+        # Translator of the last run, for its report
+        self.translator = None
+    
     def execute(self, input_data):
-        """Execute translation"""
-        translator = ToolFactory.create_tool("translate", input_data)
-        return translator.translate()
+        """
+        Execute translation
+        
+        With a build cache the assembly of every VM file is cached on its
+        own, so only changed files are retranslated; the bootstrap code (and
+        the peephole pass over the whole program) is redone on every run.
+        """
+        translator = self.translator = ToolFactory.create_tool(
+            "translate", input_data, optimize=self.optimize, shared_calls=self.shared_calls,
+            shared_compares=self.shared_compares, inline_constants=self.inline_constants,
+            fuse_branches=self.fuse_branches, cache_top=self.cache_top
+        )
+        # IR fragments are cached without comments
+        options = {
+            'shared_calls': self.shared_calls,
+            'shared_compares': self.shared_compares, 'inline_constants': self.inline_constants,
+            'fuse_branches': self.fuse_branches, 'cache_top': self.cache_top,
+            'multi_file': translator.multi_file, 'ir': self.hand_over_ir,
+        }
+        fetch_fragment = None
+        if self.cache is not None:
+            def fetch_fragment(filepath, build):
+                return self.cache.fetch("translate", [filepath], options, build)
+        if not self.hand_over_ir:
+            return translator.translate(fetch_fragment)
+        # The next step assembles IR records, so no assembly text is formatted and re-tokenized
+        records = translator.translate_ir(fetch_fragment)
+        return RecordStream(output_name(input_data, self.extension), records, asm_ir.format_record)
+
+    def stream(self, input_data):
+        """Translate to assembler IR records, produced per VM command (unless optimizing or cached)"""
+        if self.optimize or self.cache is not None:
+            return super().stream(input_data)
+        translator = self.translator = ToolFactory.create_tool(
+            "translate", input_data, shared_calls=self.shared_calls, shared_compares=self.shared_compares,
+            inline_constants=self.inline_constants, fuse_branches=self.fuse_branches,
+            cache_top=self.cache_top
+        )
+        return RecordStream(output_name(input_data, self.extension), translator.translate_stream(),
+                            asm_ir.format_record)
+
+    def report(self):
+        """Get the optimization report of the last translation"""
+        return self.translator.report() if self.translator else ''
 
 
 class AssembleCommand(Command):
     """Command for assembling assembly code to machine code"""
     
+    name = "assemble"
+    accepts_ir = True
+    
+    def __init__(self, single_pass=False, output_format='hack', listing=False, cache=None):
+        """
+        Initialize assemble command
+        
+        Args:
+            single_pass: Use the single-pass backpatching assembler
+            output_format: Machine code format ('hack', 'bin' or 'hex')
+            listing: Write a .lst listing next to the input file
+            cache: Optional BuildCache (not used when a listing is written)
+        """
+        self.single_pass = single_pass
+        self.output_format = output_format
+        self.listing = listing
+        self.cache = None if listing else cache
+        self.extension = f'.{output_format}'
+    
     def execute(self, input_data):
         """Execute assembly"""
-        assembler = ToolFactory.create_tool("assemble", input_data)
-        return assembler.assemble()
+        listing_path = os.path.splitext(source_name(input_data))[0] + '.lst' if self.listing else None
+        assembler = ToolFactory.create_tool("assemble", input_data, single_pass=self.single_pass,
+                                            output_format=self.output_format, listing_path=listing_path)
+        options = {'single_pass': self.single_pass, 'output_format': self.output_format}
+        return self.cached("assemble", [input_data], options, assembler.assemble)
+
+    def stream(self, input_data):
+        """
+        Assemble streamed IR records in a single pass
+        
+        Streamed records are always encoded in a single pass with backpatching,
+        as with --single-pass. A listing, a build cache or text input runs the
+        whole assembler instead.
+        """
+        if self.listing or self.cache is not None or not isinstance(input_data, RecordStream):
+            return super().stream(input_data)
+        assembler = ToolFactory.create_tool("assemble", input_data, single_pass=True,
+                                            output_format=self.output_format)
+        return RecordStream(output_name(input_data, self.extension), assembler.assemble_stream())
+
+
+class RunCommand(Command):
+    """Command for running machine code on the Hack emulator"""
+    
+    name = "run"
+    
+    def __init__(self, max_cycles=10000000, uart_input=b'', jit=False):
+        """
+        Initialize run command
+        
+        Args:
+            max_cycles: Maximum number of CPU cycles to run
+            uart_input: Bytes fed to the UART receiver
+            jit: Use the basic-block compiling executor
+        """
+        self.max_cycles = max_cycles
+        self.uart_input = uart_input
+        self.jit = jit
+    
+    def execute(self, input_data):
+        """Execute program, or every program of a directory in lockstep"""
+        if not is_stream(input_data) and os.path.isdir(input_data):
+            emulator = ToolFactory.create_tool("run_batch", input_data, max_cycles=self.max_cycles,
+                                               uart_input=self.uart_input)
+        else:
+            emulator = ToolFactory.create_tool("run", input_data, max_cycles=self.max_cycles,
+                                               uart_input=self.uart_input, jit=self.jit)
+        return emulator.run()
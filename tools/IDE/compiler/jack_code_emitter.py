@@ -1,10 +1,14 @@
 """
 Jack Compiler Code Emitter
-Generates VM code from parsed Jack language structures
+Generates VM code from the AST built by the Jack parser
 Manages symbol tables for class and subroutine scopes
 """
 
 from interfaces import ICodeEmitter
+from vm_translator.vm_parser import VMParser
+from compiler.jack_parser import (
+    LetStatement, IfStatement, WhileStatement, DoStatement, ReturnStatement, Term
+)
 
 
 class SymbolTable:
@@ -13,6 +17,9 @@ class SymbolTable:
     def __init__(self):
         """Initialize empty symbol table"""
         self.table = []
+        # Rows indexed by name and number of rows of each kind
+        self._rows = {}
+        self._counts = {}
     
     def define(self, name, type, kind):
         """
@@ -23,12 +30,17 @@ class SymbolTable:
             type: Variable type
             kind: Variable kind (static, field, arg, var)
         """
-        self.table.append({
+        index = self._counts.get(kind, 0)
+        row = {
             "name": name,
             "type": type,
             "kind": kind,
-            "index": self.countByKind(kind),
-        })
+            "index": index,
+        }
+        self.table.append(row)
+        self._counts[kind] = index + 1
+        # A redefined name keeps resolving to its first definition
+        self._rows.setdefault(name, row)
     
     def countByKind(self, kind):
         """
@@ -40,11 +52,7 @@ class SymbolTable:
         Returns:
             Number of variables of that kind
         """
-        count = 0
-        for row in self.table:
-            if row["kind"] == kind:
-                count += 1
-        return count
+        return self._counts.get(kind, 0)
     
     def kindOf(self, name):
         """Get kind of named variable"""
@@ -71,23 +79,40 @@ class SymbolTable:
         Returns:
             Symbol table entry or None
         """
-        for row in self.table:
-            if row["name"] == name:
-                return row
-        return None
+        return self._rows.get(name)
 
 
 class JackCodeEmitter(ICodeEmitter):
     """Emits VM code for Jack language constructs"""
     
-    def __init__(self, file):
+    # VM commands of the binary operators (Op.vmLang) and their compile-time evaluation
+    # on 16-bit values; comparisons test the wrapped difference like the translated code
+    MULTIPLY = 'call Math.multiply 2'
+    # Value of the constant true
+    TRUE = -1
+    _foldedOps = {
+        'add': lambda a, b: a + b,
+        'sub': lambda a, b: a - b,
+        'call Math.multiply 2': lambda a, b: a * b,
+        'call Math.divide 2': lambda a, b: (abs(a) // abs(b)) * (1 if (a < 0) == (b < 0) else -1) if b else None,
+        'and': lambda a, b: a & b,
+        'or': lambda a, b: a | b,
+        'lt': lambda a, b: -1 if JackCodeEmitter.int16(a - b) < 0 else 0,
+        'gt': lambda a, b: -1 if JackCodeEmitter.int16(a - b) > 0 else 0,
+        'eq': lambda a, b: -1 if JackCodeEmitter.int16(a - b) == 0 else 0,
+    }
+
+    def __init__(self, file, foldConstants=False):
         """
         Initialize code emitter
         
         Args:
             file: Output file stream for VM code
+            foldConstants: Evaluate constant expressions at compile time and turn
+                multiplications by powers of two into additions
         """
         self.file = file
+        self.foldConstants = foldConstants
         self.className = ''
         self.classScope = SymbolTable()
         self.subroutineScope = SymbolTable()
@@ -118,29 +143,335 @@ class JackCodeEmitter(ICodeEmitter):
             row = self.classScope._getNamedRow(name)
         return row
     
+    def compileClass(self, node):
+        """
+        Generate the VM code of a parsed class
+        
+        Args:
+            node: Class node
+            
+        Yields:
+            After the code of each subroutine, so it can be drained
+        """
+        self.className = node.name
+        self.classScope = SymbolTable()
+        for classVarDec in node.classVarDecs:
+            for name in classVarDec.names:
+                self.classScope.define(name, classVarDec.type, classVarDec.kind)
+        for subroutineDec in node.subroutineDecs:
+            self.compileSubroutine(subroutineDec)
+            yield
+
+    def compileSubroutine(self, node):
+        """Generate the VM code of a constructor, function or method"""
+        self.subroutineScope = SymbolTable()
+        if node.keyword == 'method':
+            self.subroutineScope.define('this', 'Array', 'argument')
+        for type, name in node.parameters:
+            self.subroutineScope.define(name, type, 'argument')
+        localsCount = 0
+        for varDec in node.varDecs:
+            for name in varDec.names:
+                self.subroutineScope.define(name, varDec.type, 'local')
+                localsCount += 1
+        self.writeFunction(f'{self.className}.{node.name}', localsCount)
+        if node.keyword == 'method':
+            self.writePush('argument', 0)
+            self.writePop('pointer', 0)
+        elif node.keyword == 'constructor':
+            self.writePush('constant', self.classScope.countByKind('this'))
+            self.writeCall('Memory.alloc', 1)
+            self.writePop('pointer', 0)
+        self.compileStatements(node.statements)
+
+    def compileStatements(self, node):
+        """Generate the VM code of a statement sequence"""
+        for statement in node.statements:
+            self._statementCompilers[type(statement)](self, statement)
+
+    def compileLet(self, node):
+        """Generate the VM code of a let statement"""
+        var = self.getByName(node.varName)
+        if node.arrExpression is not None:
+            self.writePush(var["kind"], var["index"])
+            self.compileExpression(node.arrExpression)
+            self.writeArithmetic('add')
+            self.writePop('temp', 0)
+        self.compileExpression(node.expression)
+        if node.arrExpression is None:
+            self.writePop(var["kind"], var["index"])
+        else:
+            self.writePush('temp', 0)
+            self.writePop('pointer', 1)
+            self.writePop('that', 0)
+
+    def compileIf(self, node):
+        """Generate the VM code of an if statement"""
+        condition = self._expressionValue(node.expression) if self.foldConstants else None
+        if condition in (self.TRUE, 0):
+            # Only the branch that is taken is compiled; the run-time test ('not',
+            # 'if-goto') takes the then-branch for true (-1) alone, so other
+            # constants are still tested
+            if condition == self.TRUE:
+                self.compileStatements(node.statements)
+            elif node.elseStatements is not None:
+                self.compileStatements(node.elseStatements)
+            return
+        self.compileExpression(node.expression)
+        self.writeArithmetic('not')
+        unique = self.getUnique()
+        elseLabel = f'el{unique}'
+        ifLabel = f'if{unique}'
+        self.writeIfGoto(elseLabel)
+        self.compileStatements(node.statements)
+        self.writeGoto(ifLabel)
+        self.writeLabel(elseLabel)
+        if node.elseStatements is not None:
+            self.compileStatements(node.elseStatements)
+        self.writeLabel(ifLabel)
+
+    def compileWhile(self, node):
+        """Generate the VM code of a while statement"""
+        condition = self._expressionValue(node.expression) if self.foldConstants else None
+        if condition == 0:
+            return
+        unique = self.getUnique()
+        doLabel = f'do{unique}'
+        whLabel = f'wh{unique}'
+        self.writeLabel(doLabel)
+        if condition == self.TRUE:
+            # Endless loop: no test (like in compileIf, only true (-1) keeps looping)
+            self.compileStatements(node.statements)
+            self.writeGoto(doLabel)
+            return
+        self.compileExpression(node.expression)
+        self.writeArithmetic('not')
+        self.writeIfGoto(whLabel)
+        self.compileStatements(node.statements)
+        self.writeGoto(doLabel)
+        self.writeLabel(whLabel)
+
+    def compileDo(self, node):
+        """Generate the VM code of a do statement (the return value is dropped)"""
+        self.compileSubroutineCall(node.subroutineCall)
+        self.writePop('temp', 0)
+
+    def compileReturn(self, node):
+        """Generate the VM code of a return statement"""
+        if node.expression is not None:
+            self.compileExpression(node.expression)
+        else:
+            self.writePush('constant', 0)
+        self.writeReturn()
+
+    def compileExpression(self, node):
+        """Generate the VM code of an expression (operators apply left to right)"""
+        if self.foldConstants:
+            self._compileFoldedExpression(node)
+            return
+        self.compileTerm(node.terms[0])
+        for op, term in zip(node.ops, node.terms[1:]):
+            self.compileTerm(term)
+            self.writeArithmetic(op)
+
+    def _compileFoldedExpression(self, node):
+        """
+        Generate the VM code of an expression, folding constants
+        
+        The value computed so far stays a compile-time constant as long as the
+        operands are constants, and a multiplication by a power of two becomes
+        one doubling per factor of two instead of a Math.multiply call.
+        """
+        value = self._constantValue(node.terms[0])
+        if value is None:
+            self.compileTerm(node.terms[0])
+        for op, term in zip(node.ops, node.terms[1:]):
+            operand = self._constantValue(term)
+            if value is not None:
+                folded = self._fold(op, value, operand) if operand is not None else None
+                if folded is not None:
+                    value = folded
+                    continue
+                if op == self.MULTIPLY and self._log2(value) is not None:
+                    # A constant has no side effects, so the term can be evaluated first
+                    self.compileTerm(term)
+                    self._writeDoublings(self._log2(value))
+                    value = None
+                    continue
+                self._writeConstant(value)
+                value = None
+            if op == self.MULTIPLY and operand is not None and self._log2(operand) is not None:
+                self._writeDoublings(self._log2(operand))
+                continue
+            if operand is not None:
+                self._writeConstant(operand)
+            else:
+                self.compileTerm(term)
+            self.writeArithmetic(op)
+        if value is not None:
+            self._writeConstant(value)
+
+    def _constantValue(self, node):
+        """
+        Evaluate a term at compile time
+        
+        Args:
+            node: Term node
+            
+        Returns:
+            16-bit signed value, None if the term is not constant
+        """
+        kind = node.kind
+        if kind == Term.INTEGER_CONSTANT:
+            value = int(node.string)
+            return value if value <= 32767 else None
+        if kind == Term.CHAR_CONSTANT:
+            return ord(node.string[1])
+        if kind == Term.KEYWORD_CONSTANT:
+            return {'true': -1, 'false': 0, 'null': 0}.get(node.string)
+        if kind == Term.EXPRESSION:
+            return self._expressionValue(node.expression)
+        if kind == Term.UNARY_OP:
+            value = self._constantValue(node.term)
+            if value is None:
+                return None
+            return self.int16(-value if node.unaryOp == 'neg' else ~value)
+        return None
+
+    def _expressionValue(self, node):
+        """Evaluate an expression at compile time (None if it is not constant)"""
+        value = self._constantValue(node.terms[0])
+        for op, term in zip(node.ops, node.terms[1:]):
+            if value is None:
+                return None
+            operand = self._constantValue(term)
+            value = self._fold(op, value, operand) if operand is not None else None
+        return value
+
+    @classmethod
+    def _fold(cls, op, a, b):
+        """Apply a binary operator to two constants (None if it cannot be folded)"""
+        value = cls._foldedOps[op](a, b)
+        return None if value is None else cls.int16(value)
+
+    @staticmethod
+    def int16(value):
+        """Wrap an integer to a 16-bit signed value"""
+        return ((value + 0x8000) & 0xFFFF) - 0x8000
+
+    @staticmethod
+    def _log2(value):
+        """Get k for value == 2**k (k >= 0), None if value is no positive power of two"""
+        if value > 0 and value & (value - 1) == 0:
+            return value.bit_length() - 1
+        return None
+
+    def _writeConstant(self, value):
+        """Push a 16-bit signed constant (push constant only takes 0..32767)"""
+        if value >= 0:
+            self.writePush('constant', value)
+        elif value == -32768:
+            self.writePush('constant', 32767)
+            self.writeArithmetic('not')
+        else:
+            self.writePush('constant', -value)
+            self.writeArithmetic('neg')
+
+    def _writeDoublings(self, count):
+        """Double the value on top of the stack count times (x + x through temp 1)"""
+        for _ in range(count):
+            self.writePop('temp', 1)
+            self.writePush('temp', 1)
+            self.writePush('temp', 1)
+            self.writeArithmetic('add')
+
+    def compileTerm(self, node):
+        """Generate the VM code of a term"""
+        kind = node.kind
+        if kind == Term.INTEGER_CONSTANT:
+            self.writePush('constant', node.string)
+        elif kind == Term.CHAR_CONSTANT:
+            self.writePush('constant', ord(node.string[1]))
+        elif kind == Term.KEYWORD_CONSTANT:
+            if node.string in ['null', 'false']:
+                self.writePush('constant', 0)
+            elif node.string == 'true':
+                self.writePush('constant', 1)
+                self.writeArithmetic('neg')
+            else:
+                self.writePush('pointer', 0)
+        elif kind == Term.STRING_CONSTANT:
+            self.writePush('constant', len(node.string))
+            self.writeCall('String.new', 1)
+            for char in node.string:
+                self.writePush('constant', ord(char))
+                self.writeCall('String.appendChar', 2)
+        elif kind == Term.VAR_NAME:
+            var = self.getByName(node.string)
+            self.writePush(var["kind"], var["index"])
+            if node.expression is not None:
+                self.compileExpression(node.expression)
+                self.writeArithmetic('add')
+                self.writePop('pointer', 1)
+                self.writePush('that', 0)
+        elif kind == Term.SUBROUTINE_CALL:
+            self.compileSubroutineCall(node.subroutineCall)
+        elif kind == Term.EXPRESSION:
+            self.compileExpression(node.expression)
+        elif kind == Term.UNARY_OP:
+            value = self._constantValue(node) if self.foldConstants else None
+            if value is not None:
+                self._writeConstant(value)
+                return
+            self.compileTerm(node.term)
+            self.writeArithmetic(node.unaryOp)
+
+    def compileSubroutineCall(self, node):
+        """
+        Generate the VM code of a subroutine call
+        
+        name(...) calls a method of the own class on this, var.name(...) a
+        method on the object in var and Class.name(...) a function or constructor.
+        """
+        var = self.getByName(node.mainName)
+        isClassMethod = node.subroutineName == ''
+        if isClassMethod:
+            self.writePush('pointer', 0)
+        if var is not None:
+            self.writePush(var["kind"], var["index"])
+        for expression in node.expressionList.expressions:
+            self.compileExpression(expression)
+        argsCount = node.expressionList.argsCount
+        if isClassMethod:
+            self.writeCall(f'{self.className}.{node.mainName}', argsCount + 1)
+        elif var is None:
+            self.writeCall(f'{node.mainName}{node.subroutineName}', argsCount)
+        else:
+            self.writeCall(f'{var["type"]}{node.subroutineName}', argsCount + 1)
+
     def writePush(self, segment, index):
         """Write VM push command"""
-        self.file.write(f'push {segment} {index}\n')
+        self._write(f'push {segment} {index}')
     
     def writePop(self, segment, index):
         """Write VM pop command"""
-        self.file.write(f'pop {segment} {index}\n')
+        self._write(f'pop {segment} {index}')
     
     def writeArithmetic(self, command):
         """Write VM arithmetic/logical command"""
-        self.file.write(f'{command}\n')
+        self._write(command)
     
     def writeLabel(self, label):
         """Write VM label"""
-        self.file.write(f'label {label}\n')
+        self._write(f'label {label}')
     
     def writeGoto(self, label):
         """Write VM goto command"""
-        self.file.write(f'goto {label}\n')
+        self._write(f'goto {label}')
     
     def writeIfGoto(self, label):
         """Write VM if-goto command"""
-        self.file.write(f'if-goto {label}\n')
+        self._write(f'if-goto {label}')
     
     def writeCall(self, name, argsCount):
         """
@@ -150,7 +481,7 @@ class JackCodeEmitter(ICodeEmitter):
             name: Function name
             argsCount: Number of arguments
         """
-        self.file.write(f'call {name} {argsCount}\n')
+        self._write(f'call {name} {argsCount}')
     
     def writeFunction(self, name, localsCount):
         """
@@ -160,11 +491,15 @@ class JackCodeEmitter(ICodeEmitter):
             name: Function name
             localsCount: Number of local variables
         """
-        self.file.write(f'function {name} {localsCount}\n')
+        self._write(f'function {name} {localsCount}')
     
     def writeReturn(self):
         """Write VM return command"""
-        self.file.write('return\n')
+        self._write('return')
+
+    def _write(self, line):
+        """Write one line of VM code"""
+        self.file.write(line + '\n')
 
     def emit_code(self, code):
         """
@@ -173,4 +508,26 @@ class JackCodeEmitter(ICodeEmitter):
         Args:
             code: Code string to emit
         """
-        self.file.write(f'{code}\n')
+        self._write(code)
+
+    # Code generator of each statement node
+    _statementCompilers = {
+        LetStatement: compileLet,
+        IfStatement: compileIf,
+        WhileStatement: compileWhile,
+        DoStatement: compileDo,
+        ReturnStatement: compileReturn,
+    }
+
+
+class JackRecordEmitter(JackCodeEmitter):
+    """Emits VM command records (as produced by VMParser) instead of text"""
+
+    def __init__(self, foldConstants=False):
+        """Initialize code emitter collecting records in self.commands"""
+        super().__init__(None, foldConstants)
+        self.commands = []
+
+    def _write(self, line):
+        """Record one VM command"""
+        self.commands.append(VMParser.parse_line(line))
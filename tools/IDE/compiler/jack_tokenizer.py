@@ -3,6 +3,9 @@ Jack Compiler Tokenizer
 Tokenizes Jack high-level language source code
 """
 
+import re
+from sources import read_source
+
 
 class Token:
     """Represents a single token in Jack language"""
@@ -25,7 +28,9 @@ class Token:
         'identifier': 'identifier'
     }
     
-    def __init__(self, string, kind, keyWord=None):
+    __slots__ = ('string', 'kind', 'keyWord', 'line', 'column')
+    
+    def __init__(self, string, kind, keyWord=None, line=None, column=None):
         """
         Initialize token
         
@@ -33,12 +38,16 @@ class Token:
             string: Token string value
             kind: Token kind (from kinds dict)
             keyWord: Keyword type if applicable
+            line: Source line of the token (1-based)
+            column: Source column of the token (1-based)
         """
         assert kind == None or kind in self.kinds
         assert keyWord == None or keyWord in self.keyWords
         self.string = string
         self.kind = kind
         self.keyWord = keyWord
+        self.line = line
+        self.column = column
 
 
 class JackTokenizer:
@@ -51,18 +60,38 @@ class JackTokenizer:
         'let', 'do', 'if', 'else', 'while', 'return'
     ]
 
+    # One pattern for the whole source: skipped whitespace and comments, then one token
+    # named by its kind (the end of the source matches too, so a match never fails and
+    # backtracks into a comment)
+    _wordEnd = r"""(?![^\s""" + re.escape(symbols) + r"""'"])"""
+    _tokenRe = re.compile(r"""
+        (?:\s+|//[^\n]*|/\*.*?(?:\*/|\Z))*
+        (?:
+            (?P<keyword>(?:""" + '|'.join(keywords) + ')' + _wordEnd + r""")
+            | (?P<integerConstant>\d+""" + _wordEnd + r""")
+            | (?P<identifier>[^\s""" + re.escape(symbols) + r"""'"]+)
+            | (?P<symbol>[""" + re.escape(symbols) + r"""])
+            | "(?P<stringConstant>[^"\n]*)"?
+            | (?P<charConstant>'[^\n]')
+            | (?P<end>\Z)
+            | (?P<error>\S)
+        )
+    """, re.DOTALL | re.VERBOSE)
+
     def __init__(self, filename):
         """
         Initialize tokenizer with Jack source file
         
+        The whole source is matched against one master regex; tokens are
+        produced lazily with a one-token lookahead buffer.
+        
         Args:
-            filename: Path to Jack source file
+            filename: Path to Jack source file or in-memory text stream
         """
-        self.insideComment = False
         self.currentToken = None
         self.lastToken = None
-        self.file = open(filename, 'r')
-        self.line = ''
+        self._tokens = self._scan(read_source(filename))
+        self._nextToken = next(self._tokens, None)
     
     def hasMoreTokens(self):
         """
@@ -71,7 +100,7 @@ class JackTokenizer:
         Returns:
             True if more tokens exist
         """
-        return self._getNextToken(False) is not None
+        return self._nextToken is not None
     
     def advance(self):
         """
@@ -80,9 +109,10 @@ class JackTokenizer:
         Returns:
             Next token
         """
-        assert self.hasMoreTokens(), 'no tokens left'
+        assert self._nextToken is not None, 'no tokens left'
         self.lastToken = self.currentToken
-        self.currentToken = self._getNextToken()
+        self.currentToken = self._nextToken
+        self._nextToken = next(self._tokens, None)
         return self.currentToken
 
     def getToken(self):
@@ -100,111 +130,40 @@ class JackTokenizer:
         Returns:
             Next token
         """
-        return self._getNextToken(False)
-
-    def _getNextToken(self, writeChange=True):
-        """
-        Get next token from input
-        
-        Args:
-            writeChange: Whether to advance position
-            
-        Returns:
-            Next token or None
-        """
-        self.line = self._removeMeaningless(self.line)
-        while self.line == '':
-            line = self.file.readline()
-            if line == '':
-                return None
-            self.line = self._removeMeaningless(line)
-        
-        token = None
-        sCrop = None
-        
-        if self.line[0] in self.symbols:
-            token = Token(self.line[0], Token.kinds['symbol'])
-            sCrop = 1
-        elif self.line[0] == '"':
-            string = self.line.split('"')[1]
-            token = Token(string, Token.kinds['stringConstant'])
-            sCrop = len(string) + 2
-        elif self.line[0] == "'":
-            if len(self.line) > 2 and self.line[2] == "'":
-                token = Token(self.line[:3], Token.kinds['charConstant'])
-                sCrop = 3
-            else:
-                raise ValueError("Invalid char constant")
-        else:
-            nextword = self.line.split(' ')[0]
-            first_symbol_idx = self._firstSymbolIndex(nextword)
-            if first_symbol_idx < len(nextword):
-                nextword = nextword[:first_symbol_idx]
-
-            if nextword.isdigit():
-                token = Token(nextword, Token.kinds['integerConstant'])
-                sCrop = len(nextword)
-            elif nextword in self.keywords:
-                token = Token(nextword, Token.kinds['keyword'], Token.keyWords[nextword])
-                sCrop = len(nextword)
-            else:
-                token = Token(nextword, Token.kinds['identifier'])
-                sCrop = len(nextword)
+        return self._nextToken
 
-        if writeChange:
-            self.line = self.line[sCrop:]
-        return token
-    
-    def _firstSymbolIndex(self, string):
-        """
-        Find index of first symbol in string
-        
-        Args:
-            string: String to search
-            
-        Returns:
-            Index of first symbol or length of string
-        """
-        index = len(string)
-        for symbol in self.symbols:
-            if symbol in string and string.index(symbol) < index:
-                index = string.index(symbol)
-        return index
-    
-    def _removeMeaningless(self, line):
+    def _scan(self, source):
         """
-        Remove comments and whitespace from line
+        Split Jack source into tokens
         
         Args:
-            line: Source line
+            source: Jack source code
             
-        Returns:
-            Cleaned line
-        """
-        multyLineS = '/*'
-        multyLineE = '*/'
-        singleLineS = '//'
-        line = line.replace('\n', '').replace('\t', '')
-        
-        if self.insideComment:
-            if multyLineE not in line:
-                line = ''
-            else:
-                line = line[line.index(multyLineE) + len(multyLineE):]
-                self.insideComment = False
-        
-        while multyLineS in line:
-            if multyLineE in line:
-                self.insideComment = False
-                line = line[:line.index(multyLineS)] + line[line.index(multyLineE) + len(multyLineE):]
+        Yields:
+            Tokens with their line and column (both 1-based)
+        """
+        match = self._tokenRe.match
+        position = 0
+        line = 1
+        lineStart = 0
+        while True:
+            found = match(source, position)
+            kind = found.lastgroup
+            start = found.start(kind)
+            newlines = source.count('\n', position, start)
+            if newlines:
+                line += newlines
+                lineStart = source.rindex('\n', position, start) + 1
+            position = found.end()
+            if kind == 'keyword':
+                string = found.group(kind)
+                yield Token(string, kind, string, line, start - lineStart + 1)
+            elif kind == 'stringConstant':
+                # The opening quote is part of the match, the token starts there
+                yield Token(found.group(kind), kind, None, line, start - lineStart)
+            elif kind == 'end':
+                return
+            elif kind == 'error':
+                raise ValueError(f"Invalid char constant at line {line}, column {start - lineStart + 1}")
             else:
-                self.insideComment = True
-                line = line[:line.index(multyLineS)]
-        
-        if singleLineS in line:
-            line = line[:line.index('//')]
-        
-        while line != '' and line[0] == ' ':
-            line = line[1:]
-        
-        return line
+                yield Token(found.group(kind), kind, None, line, start - lineStart + 1)
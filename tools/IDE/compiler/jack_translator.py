@@ -4,23 +4,43 @@ Translates Jack high-level language to VM code
 """
 
 import io
+import glob
+from concurrent.futures import ProcessPoolExecutor
 from compiler.jack_tokenizer import JackTokenizer
-from compiler.jack_code_emitter import JackCodeEmitter
+from compiler.jack_code_emitter import JackCodeEmitter, JackRecordEmitter
 from compiler.jack_parser import Class
+from sources import is_stream
 import os
 
 
+def compile_file(filepath, fold_constants=False):
+    """
+    Compile one Jack file (module-level so worker processes can run it)
+    
+    Args:
+        filepath: Path to Jack source file
+        fold_constants: Fold constant expressions (see JackCodeEmitter)
+        
+    Returns:
+        VM code as string
+    """
+    return JackTranslator(filepath, fold_constants).compile()
+
+
 class JackTranslator:
     """Translator for Jack language to VM code"""
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, fold_constants=False):
         """
         Initialize translator with Jack source file
         
         Args:
-            filepath: Path to Jack source file
+            filepath: Path to Jack source file or in-memory text stream
+            fold_constants: Evaluate constant expressions at compile time and turn
+                multiplications by powers of two into additions
         """
         self.filepath = filepath
+        self.fold_constants = fold_constants
 
     def compile(self):
         """
@@ -31,14 +51,85 @@ class JackTranslator:
         """
         output = io.StringIO()
         tokenizer = JackTokenizer(self.filepath)
-        writer = JackCodeEmitter(output)
+        writer = JackCodeEmitter(output, self.fold_constants)
 
         # Parse and compile all classes
         while tokenizer.hasMoreTokens():
             if tokenizer.peekNextToken().string != 'class':
                 return print('ERROR!!!!! non-class root token [' + tokenizer.getToken().string + '->' + tokenizer.peekNextToken().string + ']')
-            Class(writer, tokenizer)
+            for _ in writer.compileClass(Class(tokenizer)):
+                pass
 
         vm_code = output.getvalue()
         output.close()
         return vm_code
+
+    def compile_stream(self):
+        """
+        Compile Jack code to a stream of VM command records
+        
+        Each class is parsed into an AST, and the records of each subroutine
+        are handed on as soon as its code is generated, so only one
+        subroutine's code is held in memory.
+        
+        Yields:
+            (command, command_type, arg1, arg2) tuples as produced by VMParser
+            
+        Raises:
+            ValueError: If a top-level token is not 'class'
+        """
+        tokenizer = JackTokenizer(self.filepath)
+        writer = JackRecordEmitter(self.fold_constants)
+
+        while tokenizer.hasMoreTokens():
+            if tokenizer.peekNextToken().string != 'class':
+                raise ValueError(f"Expected 'class' at line {tokenizer.peekNextToken().line}, "
+                                 f"got '{tokenizer.peekNextToken().string}'")
+            for _ in writer.compileClass(Class(tokenizer)):
+                yield from writer.commands
+                writer.commands = []
+
+    @staticmethod
+    def collect_files(filepath):
+        """
+        List the Jack files to compile
+        
+        Args:
+            filepath: Jack file, directory, glob pattern or list of Jack files
+            
+        Returns:
+            List of Jack file paths (directories and patterns are sorted by name)
+        """
+        if isinstance(filepath, (list, tuple)):
+            return list(filepath)
+        if is_stream(filepath):
+            return [filepath]
+        if os.path.isdir(filepath):
+            return sorted(
+                os.path.join(filepath, name) for name in os.listdir(filepath) if name.endswith('.jack')
+            )
+        if glob.has_magic(filepath):
+            return sorted(glob.glob(filepath, recursive=True))
+        return [filepath]
+
+    @staticmethod
+    def compile_files(filepaths, jobs=1, fold_constants=False):
+        """
+        Compile several Jack classes in this process or across worker processes
+        
+        Jack classes compile independently, so with jobs > 1 the files are
+        spread over a ProcessPoolExecutor.
+        
+        Args:
+            filepaths: List of Jack file paths
+            jobs: Number of worker processes (1 compiles in this process)
+            fold_constants: Fold constant expressions (see JackCodeEmitter)
+            
+        Returns:
+            Dictionary of Jack file path to VM code
+        """
+        if jobs == 1 or len(filepaths) < 2:
+            return {filepath: compile_file(filepath, fold_constants) for filepath in filepaths}
+        with ProcessPoolExecutor(max_workers=min(jobs, len(filepaths))) as executor:
+            vm_codes = executor.map(compile_file, filepaths, [fold_constants] * len(filepaths))
+            return dict(zip(filepaths, vm_codes))
@@ -0,0 +1,162 @@
+"""
+Hack Batch Emulator
+Runs many independent Hack machines in lockstep, with registers and RAM held
+in NumPy arrays and every step applied with vectorized masks
+"""
+
+import os
+import time
+import numpy as np
+from emulator.hack_cpu import HackIO, RAM_SIZE, CPU_FREQ, load_rom
+
+
+class HackBatchCPU:
+    """N independent Hack CPUs stepped together"""
+
+    def __init__(self, roms, ios=None):
+        """
+        Initialize machines with their program images
+
+        Args:
+            roms: List of N program images (lists of 16-bit machine words)
+            ios: Optional list of N HackIO devices (default sets are created if omitted)
+        """
+        n = len(roms)
+        length = max(len(rom) for rom in roms) + 1
+        self.ios = ios if ios is not None else [HackIO() for _ in range(n)]
+        self.rows = np.arange(n)
+        self.rom_size = np.array([len(rom) for rom in roms], dtype=np.int64)
+
+        self._words = np.zeros((n, length), dtype=np.uint16)
+        for i, rom in enumerate(roms):
+            self._words[i, :len(rom)] = rom
+        # '@X; 0;JMP' self-loops end programs
+        words = self._words
+        previous = np.concatenate([np.full((n, 1), 0xFFFF, dtype=np.uint16), words[:, :-1]], axis=1)
+        self._halts = (((words & 0xE03F) == 0xE007) & (previous == np.arange(length) - 1))
+
+        self.ram = np.zeros((n, RAM_SIZE), dtype=np.uint16)
+        self.a = np.zeros(n, dtype=np.uint16)
+        self.d = np.zeros(n, dtype=np.uint16)
+        self.pc = np.zeros(n, dtype=np.int64)
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.halted = np.zeros(n, dtype=bool)
+
+    def _read_m(self, active):
+        """Read M for the active machines that need it, going through I/O above the RAM"""
+        a = self.a
+        m = self.ram[self.rows, a & (RAM_SIZE - 1)]
+        io_rows = np.nonzero(active & (a >= RAM_SIZE))[0]
+        for i in io_rows:
+            m[i] = self.ios[i].read(int(a[i]), int(self.cycles[i]))
+        return m
+
+    def _write_m(self, active, out):
+        """Write out to M for the active machines, going through I/O above the RAM"""
+        a = self.a
+        in_ram = active & (a < RAM_SIZE)
+        self.ram[self.rows[in_ram], a[in_ram]] = out[in_ram]
+        for i in np.nonzero(active & (a >= RAM_SIZE))[0]:
+            self.ios[i].write(int(a[i]), int(out[i]), int(self.cycles[i]))
+
+    def step(self):
+        """
+        Execute one instruction on every running machine
+
+        Returns:
+            Number of machines that executed an instruction
+        """
+        self.halted |= self.pc >= self.rom_size
+        running = ~self.halted
+        if not running.any():
+            return 0
+        rows, pc = self.rows, np.minimum(self.pc, self._words.shape[1] - 1)
+        self.cycles += running
+
+        # Decode this step's instruction of every machine once
+        word = self._words[rows, pc]
+        is_c = ((word & 0x8000) != 0) & running
+        is_a = ((word & 0x8000) == 0) & running
+
+        # ALU (fpga/modules/ALU.v) on all machines; results are only committed where masked
+        reads_m = is_c & ((word & 0x1000) != 0)
+        m = self._read_m(reads_m)
+        x = np.where(word & 0x0800, np.uint16(0), self.d)
+        x = np.where(word & 0x0400, ~x, x)
+        y = np.where(reads_m, m, self.a)
+        y = np.where(word & 0x0200, np.uint16(0), y)
+        y = np.where(word & 0x0100, ~y, y)
+        out = np.where(word & 0x0080, x + y, x & y)
+        out = np.where(word & 0x0040, ~out, out)
+
+        self._write_m(is_c & ((word & 0x0008) != 0), out)
+
+        # Jump target is the A register before this instruction updates it
+        target = self.a.astype(np.int64)
+        condition = np.where(out & 0x8000, 0b100, np.where(out == 0, 0b010, 0b001))
+        taken = is_c & ((word & condition) != 0)
+
+        self.a = np.where(is_a, word, self.a)
+        self.a = np.where(is_c & ((word & 0x0020) != 0), out, self.a)
+        self.d = np.where(is_c & ((word & 0x0010) != 0), out, self.d)
+        self.halted |= taken & self._halts[rows, pc]
+        self.pc = np.where(taken, target, np.where(running, self.pc + 1, self.pc))
+        return int(running.sum())
+
+    def run(self, max_cycles):
+        """
+        Step all machines until every one has halted or the cycle budget is used up
+
+        Args:
+            max_cycles: Maximum number of CPU cycles per machine
+
+        Returns:
+            Number of lockstep steps executed
+        """
+        steps = 0
+        while steps < max_cycles and self.step():
+            steps += 1
+        return steps
+
+
+class HackBatchEmulator:
+    """Runs every program image of a directory on its own emulated Hack board"""
+
+    def __init__(self, dirpath, max_cycles=10000000, uart_input=b''):
+        """
+        Initialize batch emulator with a directory of program images
+
+        Args:
+            dirpath: Directory holding .hack/.bin program images
+            max_cycles: Maximum number of CPU cycles per machine
+            uart_input: Bytes fed to every machine's UART receiver
+        """
+        self.filepaths = sorted(
+            os.path.join(dirpath, name) for name in os.listdir(dirpath)
+            if name.endswith('.hack') or name.endswith('.bin')
+        )
+        self.max_cycles = max_cycles
+        ios = [HackIO(uart_input=uart_input) for _ in self.filepaths]
+        self.cpu = HackBatchCPU([load_rom(path) for path in self.filepaths], ios)
+
+    def run(self):
+        """
+        Run all programs in lockstep
+
+        Returns:
+            Run report as string, one line per program
+        """
+        start = time.perf_counter()
+        self.cpu.run(self.max_cycles)
+        elapsed = time.perf_counter() - start
+        cpu = self.cpu
+        lines = [f'machines: {len(self.filepaths)}, host time: {elapsed:.3f}s, '
+                 f'host speed: {int(cpu.cycles.sum()) / elapsed if elapsed else 0:.0f} instructions/s']
+        for i, path in enumerate(self.filepaths):
+            status = 'halted' if cpu.halted[i] else 'cycle limit reached'
+            lines.append(
+                f'{os.path.basename(path)}: cycles={cpu.cycles[i]} ({cpu.cycles[i] / CPU_FREQ:.6f}s) '
+                f'{status} at pc={cpu.pc[i]} A={cpu.a[i]} D={cpu.d[i]} '
+                f'uart tx={cpu.ios[i].uart_output.decode("latin-1")!r}'
+            )
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,306 @@
+"""
+Hack CPU Emulator
+Executes assembled Hack machine code, mirroring fpga/modules/CPU.v and the
+memory map of fpga/modules/MemoryMappedIO.v
+"""
+
+import math
+from sources import read_source, source_name
+
+
+# Memory map (fpga/modules/MemoryMappedIO.v)
+ADDR_RAM_END = 2047
+ADDR_LED = 2048
+ADDR_BUTTON = 2049
+ADDR_UART_RX = 2050
+ADDR_UART_TX = 2051
+ADDR_LCD_DATA = 2053
+ADDR_LCD_CMD = 2054
+ADDR_LCD_STATUS = 2055
+RAM_SIZE = ADDR_RAM_END + 1
+ROM_SIZE = 2048
+
+# Clocking (fpga/designs/Hack/Hack.v, CLK_Divider.v, UartTX.v)
+CLK_FREQ = 100000000
+CLK_DIVISOR = 500
+CLKS_PER_CYCLE = 2 * (CLK_DIVISOR + 1)
+CPU_FREQ = CLK_FREQ / CLKS_PER_CYCLE
+UART_BAUD_RATE = 115200
+UART_TX_BUSY_CYCLES = math.ceil(10 * (CLK_FREQ // UART_BAUD_RATE) / CLKS_PER_CYCLE)
+
+# ALU computations as Python expressions over d, a, m (comp bits 'a c1..c6' -> expression)
+ALU_EXPRESSIONS = {
+    0b0101010: '0', 0b0111111: '1', 0b0111010: '0xFFFF',
+    0b0001100: 'd', 0b0110000: 'a', 0b1110000: 'm',
+    0b0001101: 'd ^ 0xFFFF', 0b0110001: 'a ^ 0xFFFF', 0b1110001: 'm ^ 0xFFFF',
+    0b0001111: '-d & 0xFFFF', 0b0110011: '-a & 0xFFFF', 0b1110011: '-m & 0xFFFF',
+    0b0011111: '(d + 1) & 0xFFFF', 0b0110111: '(a + 1) & 0xFFFF', 0b1110111: '(m + 1) & 0xFFFF',
+    0b0001110: '(d - 1) & 0xFFFF', 0b0110010: '(a - 1) & 0xFFFF', 0b1110010: '(m - 1) & 0xFFFF',
+    0b0000010: '(d + a) & 0xFFFF', 0b1000010: '(d + m) & 0xFFFF',
+    0b0010011: '(d - a) & 0xFFFF', 0b1010011: '(d - m) & 0xFFFF',
+    0b0000111: '(a - d) & 0xFFFF', 0b1000111: '(m - d) & 0xFFFF',
+    0b0000000: 'd & a', 0b1000000: 'd & m',
+    0b0010101: 'd | a', 0b1010101: 'd | m',
+}
+
+# Jump bits test the ALU output class: j2 = negative, j1 = zero, j0 = positive
+JUMP_NEGATIVE = 0b100
+JUMP_ZERO = 0b010
+JUMP_POSITIVE = 0b001
+
+
+def alu(x, y, control):
+    """
+    Gate-level Hack ALU (fpga/modules/ALU.v) for arbitrary control bits
+
+    Args:
+        x: 16-bit X input (D register)
+        y: 16-bit Y input (A register or M)
+        control: 6 control bits zx nx zy ny f no
+
+    Returns:
+        16-bit ALU output
+    """
+    if control & 0b100000:
+        x = 0
+    if control & 0b010000:
+        x ^= 0xFFFF
+    if control & 0b001000:
+        y = 0
+    if control & 0b000100:
+        y ^= 0xFFFF
+    out = (x + y) & 0xFFFF if control & 0b000010 else x & y
+    if control & 0b000001:
+        out ^= 0xFFFF
+    return out
+
+
+def alu_function(comp):
+    """
+    Get a function computing a comp field
+
+    Args:
+        comp: 7-bit comp field (a bit followed by c1..c6)
+
+    Returns:
+        Function of (d, a, m) returning the 16-bit result
+    """
+    expression = ALU_EXPRESSIONS.get(comp)
+    if expression is not None:
+        return eval(f'lambda d, a, m: {expression}')
+    control = comp & 0b111111
+    if comp & 0b1000000:
+        return lambda d, a, m: alu(d, m, control)
+    return lambda d, a, m: alu(d, a, control)
+
+
+def jump_class(value):
+    """Get jump class bit (negative/zero/positive) of a 16-bit value"""
+    if value & 0x8000:
+        return JUMP_NEGATIVE
+    return JUMP_ZERO if value == 0 else JUMP_POSITIVE
+
+
+def decode(word):
+    """
+    Decode a machine word into its instruction fields
+
+    Args:
+        word: 16-bit machine word
+
+    Returns:
+        Tuple of (is_c_instruction, value_or_comp, dest, jump)
+    """
+    if not word & 0x8000:
+        return False, word, 0, 0
+    return True, (word >> 6) & 0b1111111, (word >> 3) & 0b111, word & 0b111
+
+
+def load_rom(filepath):
+    """
+    Load a program image
+
+    Args:
+        filepath: Path to (or in-memory stream of) a .hack (binary text) or .bin (packed big-endian) image
+
+    Returns:
+        List of 16-bit machine words
+    """
+    if source_name(filepath).endswith('.bin'):
+        image = read_source(filepath, binary=True)
+        return [int.from_bytes(image[i:i + 2], 'big') for i in range(0, len(image) - 1, 2)]
+    return [int(line, 2) for line in read_source(filepath).split()]
+
+
+class HackIO:
+    """Memory-mapped I/O devices of the Hack board"""
+
+    def __init__(self, uart_input=b'', buttons=0, tx_busy_cycles=UART_TX_BUSY_CYCLES):
+        """
+        Initialize devices
+
+        Args:
+            uart_input: Bytes delivered to the UART receiver, one per read of ADDR_UART_RX
+            buttons: State of the two board buttons (bit 0, bit 1)
+            tx_busy_cycles: CPU cycles the UART transmitter stays busy per byte
+        """
+        self.led = 0
+        self.button = 0
+        self.buttons = buttons
+        self.uart_rx = 0
+        self.uart_input = list(uart_input)
+        self.uart_output = bytearray()
+        self.tx_busy_cycles = tx_busy_cycles
+        self.tx_busy_until = 0
+        self.lcd_output = []
+
+    def read(self, address, cycle):
+        """
+        Read from an I/O address
+
+        Args:
+            address: Address above the RAM
+            cycle: Current CPU cycle
+
+        Returns:
+            16-bit value
+        """
+        if address == ADDR_LED:
+            return self.led
+        elif address == ADDR_BUTTON:
+            return self.button
+        elif address == ADDR_UART_RX:
+            # The receiver latches the last byte; the next pending byte arrives once it has been read
+            value = self.uart_rx
+            if self.uart_input:
+                self.uart_rx = self.uart_input.pop(0)
+            return value
+        elif address == ADDR_UART_TX:
+            return 0xFFFF if cycle < self.tx_busy_until else 0
+        elif address == ADDR_LCD_STATUS:
+            return 0b01
+        return 0
+
+    def write(self, address, value, cycle):
+        """
+        Write to an I/O address
+
+        Args:
+            address: Address above the RAM
+            value: 16-bit value
+            cycle: Current CPU cycle
+        """
+        if address == ADDR_LED:
+            self.led = value
+        elif address == ADDR_BUTTON:
+            self.button = self.buttons & 0b11
+        elif address == ADDR_UART_TX:
+            if cycle >= self.tx_busy_until:
+                self.uart_output.append(value & 0xFF)
+                self.tx_busy_until = cycle + self.tx_busy_cycles
+        elif address == ADDR_LCD_DATA:
+            self.lcd_output.append((False, value & 0xFF))
+        elif address == ADDR_LCD_CMD:
+            self.lcd_output.append((True, value & 0xFF))
+
+
+class HackCPU:
+    """Cycle-counting Hack CPU executing one instruction per CPU clock"""
+
+    def __init__(self, rom, io=None):
+        """
+        Initialize CPU with a program image
+
+        Args:
+            rom: List of 16-bit machine words
+            io: HackIO devices (a default set is created if omitted)
+        """
+        self.rom = list(rom)
+        self.io = io if io is not None else HackIO()
+        self.ram = [0] * RAM_SIZE
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+        self._program = [self._predecode(address, word) for address, word in enumerate(self.rom)]
+
+    def _predecode(self, address, word):
+        """
+        Pre-dispatch a machine word into an opcode tuple
+
+        A-instructions become plain integers. C-instructions become
+        (alu_function, reads_m, dest, jump, halts) tuples, where halts marks the
+        '@X; 0;JMP' self-loop used to end programs.
+        """
+        is_c, comp, dest, jump = decode(word)
+        if not is_c:
+            return comp
+        halts = (jump == 0b111 and dest == 0 and address > 0 and self.rom[address - 1] == address - 1)
+        return alu_function(comp), bool(comp & 0b1000000), dest, jump, halts
+
+    def reset(self):
+        """Reset registers and program counter (RAM keeps its contents)"""
+        self.a = self.d = self.pc = 0
+        self.halted = False
+
+    def run(self, max_cycles):
+        """
+        Run until the program halts, leaves the ROM or the cycle budget is used up
+
+        Args:
+            max_cycles: Maximum number of CPU cycles to execute
+
+        Returns:
+            Number of cycles executed
+        """
+        if self.halted:
+            return 0
+        program = self._program
+        ram = self.ram
+        io = self.io
+        rom_size = len(program)
+        a, d, pc, cycles = self.a, self.d, self.pc, self.cycles
+        start = cycles
+        limit = cycles + max_cycles
+
+        while cycles < limit:
+            if pc >= rom_size:
+                self.halted = True
+                break
+            op = program[pc]
+            cycles += 1
+            if op.__class__ is int:
+                a = op
+                pc += 1
+                continue
+            fn, reads_m, dest, jump, halts = op
+            if reads_m:
+                m = ram[a] if a < RAM_SIZE else io.read(a, cycles)
+            else:
+                m = 0
+            out = fn(d, a, m)
+            if dest & 0b001:
+                if a < RAM_SIZE:
+                    ram[a] = out
+                else:
+                    io.write(a, out, cycles)
+            target = a
+            if dest & 0b100:
+                a = out
+            if dest & 0b010:
+                d = out
+            if jump and jump & (JUMP_NEGATIVE if out & 0x8000 else JUMP_ZERO if out == 0 else JUMP_POSITIVE):
+                pc = target
+                if halts:
+                    self.halted = True
+                    break
+            else:
+                pc += 1
+
+        self.a, self.d, self.pc, self.cycles = a, d, pc, cycles
+        return cycles - start
+
+    def step(self):
+        """Execute a single instruction"""
+        return self.run(1)
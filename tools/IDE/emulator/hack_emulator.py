@@ -0,0 +1,63 @@
+"""
+Hack Emulator
+Runs an assembled Hack program image and reports what it did
+"""
+
+import time
+from emulator.hack_cpu import HackCPU, HackIO, CPU_FREQ, load_rom
+from emulator.hack_jit import HackBlockCPU
+
+
+class HackEmulator:
+    """Runs .hack/.bin program images on the emulated Hack board"""
+
+    def __init__(self, filepath, max_cycles=10000000, uart_input=b'', buttons=0, jit=False):
+        """
+        Initialize emulator with a program image
+
+        Args:
+            filepath: Path to a .hack or .bin program image
+            max_cycles: Maximum number of CPU cycles to run
+            uart_input: Bytes fed to the UART receiver
+            buttons: State of the two board buttons
+            jit: Execute compiled basic blocks instead of single instructions
+        """
+        self.filepath = filepath
+        self.max_cycles = max_cycles
+        self.io = HackIO(uart_input=uart_input, buttons=buttons)
+        cpu_class = HackBlockCPU if jit else HackCPU
+        self.cpu = cpu_class(load_rom(filepath), self.io)
+
+    def report(self, elapsed):
+        """
+        Format a summary of the finished run
+
+        Args:
+            elapsed: Host seconds spent running
+
+        Returns:
+            Report as string
+        """
+        cpu = self.cpu
+        lines = [
+            f'cycles: {cpu.cycles}',
+            f'status: {"halted" if cpu.halted else "cycle limit reached"} at pc={cpu.pc}',
+            f'board time: {cpu.cycles / CPU_FREQ:.6f}s at {CPU_FREQ:.0f} Hz',
+            f'host speed: {cpu.cycles / elapsed if elapsed else 0:.0f} instructions/s',
+            f'registers: A={cpu.a} D={cpu.d}',
+            f'led: {self.io.led}',
+            f'uart tx: {self.io.uart_output.decode("latin-1")!r}',
+            f'lcd writes: {len(self.io.lcd_output)}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def run(self):
+        """
+        Run the program until it halts or the cycle budget is used up
+
+        Returns:
+            Run report as string
+        """
+        start = time.perf_counter()
+        self.cpu.run(self.max_cycles)
+        return self.report(time.perf_counter() - start)
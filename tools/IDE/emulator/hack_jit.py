@@ -0,0 +1,176 @@
+"""
+Hack Block Compiler
+Executes Hack machine code by compiling basic blocks of the ROM into Python
+functions, cached per ROM address
+"""
+
+import re
+from emulator.hack_cpu import HackCPU, ALU_EXPRESSIONS, RAM_SIZE, alu, decode
+
+
+# Jump conditions on the ALU output (j bits -> Python condition)
+JUMP_CONDITIONS = {
+    0b001: '0 < out < 0x8000',
+    0b010: 'out == 0',
+    0b011: 'out < 0x8000',
+    0b100: 'out >= 0x8000',
+    0b101: 'out != 0',
+    0b110: 'out == 0 or out >= 0x8000',
+    0b111: 'True',
+}
+
+_a_operand = re.compile(r'\ba\b')
+
+
+class HackBlockCPU(HackCPU):
+    """Hack CPU that runs compiled basic blocks instead of single instructions"""
+
+    def __init__(self, rom, io=None):
+        """
+        Initialize CPU with a program image
+
+        Args:
+            rom: List of 16-bit machine words
+            io: HackIO devices (a default set is created if omitted)
+        """
+        super().__init__(rom, io)
+        self._blocks = [None] * len(self.rom)
+
+    def _block_source(self, entry):
+        """
+        Generate Python source for the basic block starting at entry
+
+        A block runs up to and including the first jumping C-instruction (or
+        the end of the ROM). A-register values loaded by A-instructions are
+        propagated as constants, so memory accesses through them are resolved
+        to RAM or I/O at compile time.
+
+        Args:
+            entry: ROM address of the first instruction
+
+        Returns:
+            Tuple of (source, instruction_count, halts)
+        """
+        lines = ['def block(a, d, ram, io, cycles):']
+        a_const = None
+        address = entry
+        halts = False
+        next_pc = None
+
+        while address < len(self.rom):
+            word = self.rom[address]
+            is_c, comp, dest, jump = decode(word)
+            cycle = f'cycles + {address - entry + 1}'
+            address += 1
+            if not is_c:
+                a_const = comp
+                continue
+
+            a_operand = str(a_const) if a_const is not None else 'a'
+            if comp & 0b1000000:
+                if a_const is None:
+                    lines.append(f'    m = ram[a] if a < {RAM_SIZE} else io.read(a, {cycle})')
+                elif a_const < RAM_SIZE:
+                    lines.append(f'    m = ram[{a_const}]')
+                else:
+                    lines.append(f'    m = io.read({a_const}, {cycle})')
+            expression = ALU_EXPRESSIONS.get(comp)
+            if expression is None:
+                y = 'm' if comp & 0b1000000 else 'a'
+                expression = f'alu(d, {y}, {comp & 0b111111})'
+            lines.append(f'    out = {_a_operand.sub(a_operand, expression)}')
+
+            if dest & 0b001:
+                if a_const is None:
+                    lines.append(f'    if a < {RAM_SIZE}: ram[a] = out')
+                    lines.append(f'    else: io.write(a, out, {cycle})')
+                elif a_const < RAM_SIZE:
+                    lines.append(f'    ram[{a_const}] = out')
+                else:
+                    lines.append(f'    io.write({a_const}, out, {cycle})')
+            target = a_operand
+            if dest & 0b100:
+                if jump and a_const is None:
+                    lines.append('    target = a')
+                    target = 'target'
+                lines.append('    a = out')
+                a_const = None
+            if dest & 0b010:
+                lines.append('    d = out')
+
+            if jump:
+                halts = (jump == 0b111 and dest == 0 and address > 1
+                         and self.rom[address - 2] == address - 2)
+                a_result = str(a_const) if a_const is not None else 'a'
+                if jump == 0b111:
+                    lines.append(f'    return {a_result}, d, {target}')
+                else:
+                    lines.append(f'    if {JUMP_CONDITIONS[jump]}: return {a_result}, d, {target}')
+                    next_pc = address
+                break
+        else:
+            next_pc = address
+
+        if next_pc is not None:
+            a_result = str(a_const) if a_const is not None else 'a'
+            lines.append(f'    return {a_result}, d, {next_pc}')
+        return '\n'.join(lines) + '\n', address - entry, halts
+
+    def _compile_block(self, entry):
+        """
+        Compile and cache the basic block starting at entry
+
+        Args:
+            entry: ROM address of the first instruction
+
+        Returns:
+            Tuple of (function, instruction_count, halts)
+        """
+        source, length, halts = self._block_source(entry)
+        namespace = {'alu': alu}
+        exec(compile(source, f'<hack block {entry}>', 'exec'), namespace)
+        block = (namespace['block'], length, halts)
+        self._blocks[entry] = block
+        return block
+
+    def run(self, max_cycles):
+        """
+        Run until the program halts, leaves the ROM or the cycle budget is used up
+
+        Whole blocks are executed while they fit into the budget; the remainder
+        is single-stepped so the cycle count is exact.
+
+        Args:
+            max_cycles: Maximum number of CPU cycles to execute
+
+        Returns:
+            Number of cycles executed
+        """
+        if self.halted:
+            return 0
+        blocks = self._blocks
+        ram = self.ram
+        io = self.io
+        rom_size = len(blocks)
+        a, d, pc, cycles = self.a, self.d, self.pc, self.cycles
+        start = cycles
+        limit = cycles + max_cycles
+
+        while cycles < limit:
+            if pc >= rom_size:
+                self.halted = True
+                break
+            block = blocks[pc] or self._compile_block(pc)
+            fn, length, halts = block
+            if cycles + length > limit:
+                break
+            a, d, pc = fn(a, d, ram, io, cycles)
+            cycles += length
+            if halts:
+                self.halted = True
+                break
+
+        self.a, self.d, self.pc, self.cycles = a, d, pc, cycles
+        if cycles < limit and not self.halted:
+            super().run(limit - cycles)
+        return self.cycles - start
@@ -3,6 +3,9 @@ Nand2Tetris IDE - Command Executor
 Executes a chain of commands in sequence, passing output from one to the next
 """
 
+import time
+from sources import in_memory, output_name
+
 
 class CommandExecutor:
     """Executor for chaining multiple commands together"""
@@ -15,11 +18,17 @@ class CommandExecutor:
             commands: List of Command objects to execute in sequence
         """
         self.commands = commands
+        self.timings = []
     
     def execute(self, input_data):
         """
         Execute all commands in sequence
         
+        Every output is handed to the next command as an in-memory stream
+        named like the file it would be written to, so a chain runs without
+        intermediate files. A command followed by one that accepts assembler
+        IR hands over IR records instead of text.
+        
         Args:
             input_data: Initial input data
             
@@ -27,6 +36,44 @@ class CommandExecutor:
             Final output after all commands have been executed
         """
         data = input_data
+        self.timings = []
+        for index, command in enumerate(self.commands):
+            following = self.commands[index + 1] if index + 1 < len(self.commands) else None
+            command.hand_over_ir = following is not None and following.accepts_ir
+            start = time.perf_counter()
+            result = command.execute(data)
+            self.timings.append((command.name, time.perf_counter() - start))
+            if isinstance(result, (str, bytes)):
+                result = in_memory(result, output_name(data, command.extension))
+            data = result
+        return data
+
+    def stream(self, input_data):
+        """
+        Execute all commands as a streaming pipeline
+        
+        Every command is handed the lazily produced output of the previous
+        one, so the stages run interleaved and no complete intermediate text
+        is built. The final output is collected once at the end.
+        
+        Args:
+            input_data: Initial input data
+            
+        Returns:
+            Final output as in-memory stream (or list of them)
+        """
+        start = time.perf_counter()
+        data = input_data
         for command in self.commands:
-            data = command.execute(data)
+            data = command.stream(data)
+        if isinstance(data, list):
+            data = [in_memory(item.read(), item.name) for item in data]
+        else:
+            data = in_memory(data.read(), data.name)
+        self.timings = [('+'.join(command.name for command in self.commands), time.perf_counter() - start)]
         return data
+
+    def report(self):
+        """Get the time spent in each step"""
+        steps = ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in self.timings)
+        return f'timings: {steps}'
@@ -1,32 +1,69 @@
 """
 Nand2Tetris IDE - Main Entry Point
-Provides command-line interface for compile, translate, and assemble operations
+Provides command-line interface for compile, translate, assemble, and run operations
 """
 
 import argparse
-import os
-from commands import CompileCommand, TranslateCommand, AssembleCommand
+from commands import CompileCommand, TranslateCommand, AssembleCommand, RunCommand
 from executor import CommandExecutor
+from build_cache import BuildCache
 
 
 def main():
     """
     Main function - parses arguments and executes the requested pipeline
     
-    Supports comma-separated steps: compile, translate, assemble
+    Supports comma-separated steps: compile, translate, assemble, run
     Example: python main.py compile,translate,assemble input.jack
+    Example: python main.py translate -o build/combined.asm Sys.vm Mem.vm UART.vm
+    Example: python main.py compile --jobs 0 "programs/jack/**/*.jack"
     """
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="nand2tetris tool")
-    parser.add_argument("steps", help="Comma-separated list of steps to execute (compile, translate, assemble)")
-    parser.add_argument("input", help="Input file or directory")
+    parser.add_argument("steps", help="Comma-separated list of steps to execute (compile, translate, assemble, run)")
+    parser.add_argument("input", nargs='+', help="Input file(s) or directory")
+    parser.add_argument("-o", "--output", help="Output file (default: input name with the extension of the last step)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Run the steps as an interleaved generator pipeline "
+                             "(streamed assembly is single-pass; cached steps run on their whole input)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Worker processes for compiling several Jack files (0 = all CPU cores)")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="Serve unchanged compile/translate/assemble outputs from a build cache directory")
+    parser.add_argument("--fold-constants", action="store_true",
+                        help="Fold constant Jack expressions and turn multiplications by powers of two into additions")
+    parser.add_argument("--optimize", action="store_true", help="Peephole-optimize the translated assembly")
+    parser.add_argument("--shared-calls", action="store_true", help="Route VM calls/returns through shared $$CALL/$$RETURN routines")
+    parser.add_argument("--shared-compares", action="store_true", help="Route VM eq/gt/lt through shared comparison routines")
+    parser.add_argument("--inline-constants", action="store_true",
+                        help="Apply constant operands of VM arithmetic in place instead of pushing them")
+    parser.add_argument("--fuse-branches", action="store_true",
+                        help="Branch on compared VM operands instead of materializing eq/gt/lt results")
+    parser.add_argument("--cache-top", action="store_true",
+                        help="Keep the top of the VM stack in the D register within basic blocks")
+    parser.add_argument("--single-pass", action="store_true", help="Assemble in a single pass with label backpatching")
+    parser.add_argument("--format", choices=["hack", "bin", "hex"], default="hack",
+                        help="Assembler output format: binary text, packed big-endian or Intel-HEX")
+    parser.add_argument("--listing", action="store_true", help="Write an address/hex/source listing (.lst)")
+    parser.add_argument("--max-cycles", type=int, default=10000000, help="Emulator cycle budget for the run step")
+    parser.add_argument("--uart-input", default="", help="Characters fed to the emulated UART receiver")
+    parser.add_argument("--jit", action="store_true", help="Run compiled basic blocks in the emulator")
     args = parser.parse_args()
 
+    cache = BuildCache(args.cache) if args.cache else None
+
     # Map step names to command objects
     step_map = {
-        "compile": CompileCommand(),
-        "translate": TranslateCommand(),
-        "assemble": AssembleCommand()
+        "compile": CompileCommand(jobs=args.jobs, fold_constants=args.fold_constants, cache=cache),
+        "translate": TranslateCommand(optimize=args.optimize, shared_calls=args.shared_calls,
+                                      shared_compares=args.shared_compares,
+                                      inline_constants=args.inline_constants,
+                                      fuse_branches=args.fuse_branches, cache_top=args.cache_top,
+                                      cache=cache),
+        "assemble": AssembleCommand(single_pass=args.single_pass, output_format=args.format,
+                                    listing=args.listing, cache=cache),
+        "run": RunCommand(max_cycles=args.max_cycles, uart_input=args.uart_input.encode('latin-1'),
+                          jit=args.jit)
     }
 
     # Build command chain from requested steps
@@ -35,24 +72,22 @@ def main():
 
     # Execute command chain
     executor = CommandExecutor(commands)
-    result = executor.execute(args.input)
-
-    # Determine output file extension based on final step
-    extension_map = {
-        "compile": ".vm",
-        "translate": ".asm",
-        "assemble": ".hack"
-    }
-    last_step = steps[-1]
-    output_extension = extension_map.get(last_step, ".out")
-
-    # Generate output filename
-    input_file_name, _ = os.path.splitext(args.input)
-    output_file = f"{input_file_name}{output_extension}"
+    input_data = args.input[0] if len(args.input) == 1 else args.input
+    result = executor.stream(input_data) if args.stream else executor.execute(input_data)
+    print(executor.report())
+    for command in commands:
+        report = command.report()
+        if report:
+            print(report)
+    if cache is not None:
+        print(cache.report())
 
-    # Write result to output file
-    with open(output_file, 'w') as f:
-        f.write(result)
+    # Write the result next to the input (compiling several classes gives one .vm per class)
+    for output in result if isinstance(result, list) else [result]:
+        output_file = args.output if args.output and not isinstance(result, list) else output.name
+        data = output.getvalue()
+        with open(output_file, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""
+Nand2Tetris IDE - Tool Inputs
+Lets every tool read its input from a file path or from an in-memory stream
+handed over by the previous pipeline step
+"""
+
+import io
+import os
+
+
+class RecordStream:
+    """
+    Lazily produced step output: a named iterator of structured records
+
+    Streaming-aware tools iterate over the records while the previous step is
+    still producing them. Every other tool can read() the formatted text like
+    from any in-memory stream. A record stream can only be consumed once.
+    """
+
+    def __init__(self, name, records, format_record=None):
+        """
+        Initialize record stream
+
+        Args:
+            name: File name the output would have on disk
+            records: Iterable of records (produced lazily)
+            format_record: Function formatting one record as text (records are text if omitted)
+        """
+        self.name = name
+        self.records = records
+        self.format_record = format_record
+
+    def __iter__(self):
+        """Iterate over the records"""
+        return iter(self.records)
+
+    def read(self):
+        """
+        Consume all records and format them
+
+        Returns:
+            Formatted text, or bytes for byte records
+        """
+        format_record = self.format_record
+        parts = [format_record(record) for record in self.records] if format_record else list(self.records)
+        if parts and isinstance(parts[0], bytes):
+            return b''.join(parts)
+        return ''.join(parts)
+
+    getvalue = read
+
+
+def in_memory(data, name):
+    """
+    Wrap a step output as a named in-memory stream
+
+    Args:
+        data: Output text or bytes
+        name: File name the output would have on disk
+
+    Returns:
+        io.StringIO (text) or io.BytesIO (bytes) with a name attribute
+    """
+    stream = io.BytesIO(data) if isinstance(data, bytes) else io.StringIO(data)
+    stream.name = name
+    return stream
+
+
+def is_stream(source):
+    """Check if a tool input is an in-memory stream rather than a path"""
+    return hasattr(source, 'read')
+
+
+def source_name(source):
+    """
+    Get the file name of a tool input
+
+    Args:
+        source: File path or named stream
+
+    Returns:
+        Path (or the name the stream was given)
+    """
+    return getattr(source, 'name', '') if is_stream(source) else source
+
+
+def read_source(source, binary=False):
+    """
+    Read the whole content of a tool input
+
+    Streams are read from the start and are left untouched, so the same
+    stream can be read more than once.
+
+    Args:
+        source: File path or stream
+        binary: Return bytes instead of text
+
+    Returns:
+        Content as text or bytes
+    """
+    if is_stream(source):
+        data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+        if binary and isinstance(data, str):
+            return data.encode('utf-8')
+        if not binary and isinstance(data, bytes):
+            return data.decode('utf-8')
+        return data
+    with open(source, 'rb' if binary else 'r') as f:
+        return f.read()
+
+
+def open_source(source):
+    """
+    Open a tool input for line-by-line reading
+
+    Args:
+        source: File path or text stream
+
+    Returns:
+        Text stream positioned at the start
+    """
+    if is_stream(source):
+        return io.StringIO(read_source(source))
+    return open(source, 'r')
+
+
+def output_name(source, extension):
+    """
+    Name the output of a step after its input
+
+    Args:
+        source: Step input (path, stream or list of them)
+        extension: Extension of the output, e.g. '.asm'
+
+    Returns:
+        Output file name; several inputs are named after their common directory
+    """
+    if isinstance(source, (list, tuple)):
+        base = os.path.commonpath([source_name(item) for item in source])
+    else:
+        base = source_name(source).rstrip('/')
+    return os.path.splitext(base)[0] + extension
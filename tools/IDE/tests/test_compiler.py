@@ -0,0 +1,117 @@
+"""
+Compiler Tests
+Checks that constant folding and strength reduction keep the behavior of the unfolded code
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmark import build_program
+from compiler.jack_translator import JackTranslator
+from emulator.hack_cpu import HackCPU
+from sources import in_memory
+
+# Results are stored from this RAM address on, well above the stack of the test program
+RESULTS = 1800
+
+SYS_JACK = """
+class Sys {
+    function void init() {
+        var Array r;
+        var int x, i;
+        let r = 1800;
+        let x = 3;
+        if (1) { let r[0] = 111; } else { let r[0] = 222; }
+        if (-1) { let r[1] = 111; } else { let r[1] = 222; }
+        if (0) { let r[2] = 111; } else { let r[2] = 222; }
+        if (2 - 1) { let r[3] = 111; }
+        let i = 0;
+        while (1) { let i = i + 1; }
+        let r[4] = i;
+        while (0) { let r[5] = 1; }
+        while (false) { let r[5] = 2; }
+        let r[6] = 32767 + 1;
+        let r[7] = -32767 - 1;
+        let r[8] = 1000 * 1000;
+        let r[9] = x * 8;
+        let r[10] = 4 * x;
+        let r[11] = x * 1;
+        let r[12] = (x - 10) * 16;
+        let r[13] = x * 16384;
+        let r[14] = x / 0;
+        let r[15] = 7 / 0;
+        let r[16] = ~0 & (5 | 8);
+        let r[17] = (3 < 5) + (32767 > -2);
+        while (true) { }
+    }
+}
+"""
+
+MATH_JACK = """
+class Math {
+    function int multiply(int x, int y) {
+        var int sum, bit;
+        let sum = 0;
+        let bit = 1;
+        while (~(bit = 0)) {
+            if (~((y & bit) = 0)) { let sum = sum + x; }
+            let x = x + x;
+            let bit = bit + bit;
+        }
+        return sum;
+    }
+
+    function int divide(int x, int y) {
+        var int q;
+        if (y = 0) { return 777; }
+        let q = 0;
+        while (~(x < y)) { let x = x - y; let q = q + 1; }
+        return q;
+    }
+}
+"""
+
+SOURCES = {'Sys': SYS_JACK, 'Math': MATH_JACK}
+
+
+def run_results(fold_constants, count=18, max_cycles=200000):
+    """Build and run the test program (it ends in an endless loop), returning its results"""
+    cpu = HackCPU(build_program(SOURCES, fold_constants).words)
+    cpu.run(max_cycles)
+    return cpu.ram[RESULTS:RESULTS + count]
+
+
+class FoldConstantsTest(unittest.TestCase):
+    """Programs compiled with and without --fold-constants"""
+
+    def test_folded_program_matches_unfolded(self):
+        self.assertEqual(run_results(fold_constants=True), run_results(fold_constants=False))
+
+    def test_constant_conditions(self):
+        # 'not; if-goto' takes only true (-1) as true
+        results = run_results(fold_constants=True)
+        self.assertEqual(results[:6], [222, 111, 222, 0, 0, 0])
+
+    def test_wrapped_values(self):
+        results = run_results(fold_constants=True)
+        self.assertEqual(results[6:9], [0x8000, 0x8000, (1000 * 1000) & 0xFFFF])
+        self.assertEqual(results[9:14], [24, 12, 3, (-7 * 16) & 0xFFFF, (3 * 16384) & 0xFFFF])
+
+    def test_folded_code(self):
+        vm_code = JackTranslator(in_memory(SYS_JACK, 'Sys.jack'), fold_constants=True).compile()
+        # -32768 has no 'push constant' of its own
+        self.assertIn('push constant 32767\nnot\n', vm_code)
+        # Multiplications by powers of two double the operand instead of calling Math.multiply
+        self.assertNotIn('call Math.multiply 2', vm_code)
+        self.assertIn('pop temp 1\npush temp 1\npush temp 1\nadd\n', vm_code)
+        # Divisions by zero are left to Math.divide
+        self.assertEqual(vm_code.count('call Math.divide 2'), 2)
+        # Constant conditions other than true and false are still tested
+        self.assertEqual(vm_code.count('if-goto'), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Emulator Tests
+Checks that the interpreting, block-compiling and batched CPUs run programs alike
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler.asm_translator import AsmTranslator
+from emulator.hack_batch import HackBatchCPU
+from emulator.hack_cpu import ADDR_LED, ADDR_UART_TX, HackCPU, HackIO
+from emulator.hack_jit import HackBlockCPU
+from sources import in_memory
+
+# Sums count..1 into RAM[17], shows the sum on the LEDs, sends it to the UART and
+# halts in an '@END; 0;JMP' self-loop
+SUM_ASM = f"""
+    @{{count}}
+    D=A
+    @16
+    M=D
+    @17
+    M=0
+(LOOP)
+    @16
+    D=M
+    @17
+    M=D+M
+    @16
+    M=M-1
+    D=M
+    @LOOP
+    D;JGT
+    @17
+    D=M
+    @{ADDR_LED}
+    M=D
+    @{ADDR_UART_TX}
+    M=D
+(END)
+    @END
+    0;JMP
+"""
+
+
+def assemble(count):
+    """Assemble the summing program for a loop count"""
+    assembler = AsmTranslator(in_memory(SUM_ASM.format(count=count), 'Sum.asm'))
+    assembler.assemble()
+    return assembler.words
+
+
+class EmulatorAgreementTest(unittest.TestCase):
+    """HackCPU, HackBlockCPU and HackBatchCPU on the same images"""
+
+    def run_single(self, cpu_class, rom, max_cycles=10000):
+        """Run an image on a single-machine CPU"""
+        io = HackIO()
+        cpu = cpu_class(rom, io)
+        cpu.run(max_cycles)
+        return cpu.halted, cpu.cycles, cpu.pc, cpu.ram, io
+
+    def test_cpus_agree(self):
+        roms = [assemble(10), assemble(3)]
+        batch = HackBatchCPU(roms, [HackIO(), HackIO()])
+        batch.run(10000)
+        for i, rom in enumerate(roms):
+            halted, cycles, pc, ram, io = self.run_single(HackCPU, rom)
+            self.assertTrue(halted)
+            self.assertEqual(ram[17], sum(range(1, [10, 3][i] + 1)))
+            self.assertEqual(io.led, ram[17])
+            self.assertEqual(bytes(io.uart_output), bytes([ram[17]]))
+            # The CPU stops on the jump of the self-loop
+            self.assertEqual(pc, len(rom) - 2)
+            with self.subTest(cpu='HackBlockCPU', rom=i):
+                block = self.run_single(HackBlockCPU, rom)
+                self.assertEqual(block[:4], (halted, cycles, pc, ram))
+                self.assertEqual((block[4].led, block[4].uart_output), (io.led, io.uart_output))
+            with self.subTest(cpu='HackBatchCPU', rom=i):
+                self.assertEqual((bool(batch.halted[i]), int(batch.cycles[i]), int(batch.pc[i])),
+                                 (halted, cycles, pc))
+                self.assertEqual(batch.ram[i].tolist(), ram)
+                self.assertEqual((batch.ios[i].led, batch.ios[i].uart_output), (io.led, io.uart_output))
+
+    def test_cycle_budget(self):
+        rom = assemble(1000)
+        for cpu_class in (HackCPU, HackBlockCPU):
+            with self.subTest(cpu=cpu_class.__name__):
+                halted, cycles, _, _, _ = self.run_single(cpu_class, rom, max_cycles=100)
+                self.assertFalse(halted)
+                self.assertGreaterEqual(cycles, 100)
+        batch = HackBatchCPU([rom])
+        batch.run(100)
+        self.assertFalse(batch.halted[0])
+        self.assertEqual(int(batch.cycles[0]), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Pipeline Tests
+Checks that the streaming pipeline builds the same image as the step-by-step one
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler.asm_translator import AsmTranslator
+from build_cache import BuildCache
+from commands import AssembleCommand, CompileCommand, TranslateCommand
+from executor import CommandExecutor
+from sources import RecordStream, in_memory
+from vm_translator.vm_translator import VMTranslator
+
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        '..', '..', '..', 'fpga', 'designs', 'Hack', 'programs', 'jack')
+SOURCES = [
+    os.path.join(PROGRAMS, 'demos', 'Sys.jack'),
+    os.path.join(PROGRAMS, 'system', 'Mem.jack'),
+    os.path.join(PROGRAMS, 'system', 'UART.jack'),
+]
+
+
+class StreamPipelineTest(unittest.TestCase):
+    """Streaming and step-by-step builds of Sys+Mem+UART"""
+
+    def build(self, stream, cache_dir=None, **translate_options):
+        """Compile, translate and assemble the sources, returning the machine code"""
+        cache = BuildCache(cache_dir) if cache_dir else None
+        executor = CommandExecutor([
+            CompileCommand(cache=cache),
+            TranslateCommand(cache=cache, **translate_options),
+            AssembleCommand(cache=cache),
+        ])
+        output = executor.stream(SOURCES) if stream else executor.execute(SOURCES)
+        return output.getvalue()
+
+    def test_stream_matches_execute(self):
+        self.assertEqual(self.build(stream=True), self.build(stream=False))
+
+    def test_optimized_stream_with_cache_matches_execute(self):
+        # The optimizer needs the whole program, so the translate step reads its streamed input
+        expected = self.build(stream=False, optimize=True)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertEqual(self.build(stream=True, cache_dir=cache_dir, optimize=True), expected)
+            self.assertEqual(self.build(stream=True, cache_dir=cache_dir, optimize=True), expected)
+
+    def test_stream_uses_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            expected = self.build(stream=True, cache_dir=cache_dir)
+            cache = BuildCache(cache_dir)
+            executor = CommandExecutor([CompileCommand(cache=cache), TranslateCommand(cache=cache),
+                                        AssembleCommand(cache=cache)])
+            self.assertEqual(executor.stream(SOURCES).getvalue(), expected)
+            # Three classes compiled, their three fragments translated and one image assembled
+            self.assertEqual((cache.hits, cache.misses), (7, 0))
+
+    def test_stream_rejects_non_class_source(self):
+        stream = CompileCommand().stream(in_memory('function void f() { return; }', 'Bad.jack'))
+        with self.assertRaises(ValueError):
+            list(stream)
+
+
+class TranslateCacheTest(unittest.TestCase):
+    """Per-file caching of the translate step"""
+
+    def test_changed_file_is_retranslated_alone(self):
+        vm_files = CompileCommand().execute(SOURCES)
+        changed = [vm_files[0], in_memory(vm_files[1].getvalue() + 'function Mem.extra 0\npush constant 1\n'
+                                          'push constant 2\ngt\nreturn\n', vm_files[1].name), vm_files[2]]
+        options = {'shared_calls': True, 'shared_compares': True}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            TranslateCommand(cache=BuildCache(cache_dir), **options).execute(vm_files)
+            cache = BuildCache(cache_dir)
+            command = TranslateCommand(cache=cache, **options)
+            uncached = TranslateCommand(**options)
+            self.assertEqual(command.execute(changed), uncached.execute(changed))
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+            self.assertEqual(command.report(), uncached.report())
+
+
+class LabelScopeTest(unittest.TestCase):
+    """VM labels are local to their function"""
+
+    def test_same_label_in_two_classes(self):
+        vm_files = [
+            in_memory('function A.f 0\nlabel wh0\npush constant 1\nif-goto wh0\nreturn\n', 'A.vm'),
+            in_memory('function B.g 0\nlabel wh0\npush constant 0\nlt\nif-goto wh0\ngoto wh0\n', 'B.vm'),
+        ]
+        for options in ({}, {'fuse_branches': True}, {'cache_top': True}):
+            asm_code = VMTranslator(vm_files, **options).translate()
+            self.assertIn('(A.f$wh0)', asm_code)
+            self.assertIn('(B.g$wh0)', asm_code)
+            self.assertNotIn('@wh0', asm_code)
+
+
+class VMFilenameTest(unittest.TestCase):
+    """VM sources are named after their class"""
+
+    def test_lowercase_name_is_rejected(self):
+        for name in ('main.vm', 'Main.txt'):
+            with self.assertRaises(ValueError):
+                VMTranslator(in_memory('function Main.main 0\n', name)).translate()
+
+    def test_name_in_directory_is_accepted(self):
+        asm_code = VMTranslator(in_memory('function Main.main 0\n', os.path.join('build', 'Main.vm'))).translate()
+        self.assertIn('(Main.main)', asm_code)
+
+
+class AInstructionRangeTest(unittest.TestCase):
+    """A-instructions hold 15-bit values"""
+
+    def test_largest_value(self):
+        self.assertEqual(AsmTranslator(in_memory('@32767\n', 'max.asm')).assemble(), '0111111111111111\n')
+
+    def test_value_out_of_range(self):
+        for single_pass in (False, True):
+            with self.assertRaises(ValueError):
+                AsmTranslator(in_memory('@40000\n', 'big.asm'), single_pass=single_pass).assemble()
+
+
+class AsmChunkStreamTest(unittest.TestCase):
+    """Assembly text handed over chunk by chunk"""
+
+    def test_text_chunks_match_whole_text(self):
+        with open(os.path.join(PROGRAMS, '..', 'asm', 'echo.asm')) as f:
+            asm_code = f.read()
+        expected = AsmTranslator(in_memory(asm_code, 'echo.asm')).assemble()
+        lines = asm_code.splitlines(keepends=True)
+        for single_pass in (True, False):
+            chunks = (''.join(lines[start:start + 7]) for start in range(0, len(lines), 7))
+            assembler = AsmTranslator(RecordStream('echo.asm', chunks), single_pass=single_pass)
+            self.assertEqual(assembler.assemble(), expected)
+        chunks = (''.join(lines[start:start + 7]) for start in range(0, len(lines), 7))
+        streamed = AsmTranslator(RecordStream('echo.asm', chunks)).assemble_stream()
+        self.assertEqual(''.join(streamed), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
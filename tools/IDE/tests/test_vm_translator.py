@@ -0,0 +1,160 @@
+"""
+VM Translator Tests
+Checks that the translator options keep the behavior of the plain translation
+"""
+
+import itertools
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from assembler import asm_ir
+from assembler.asm_translator import AsmTranslator
+from compiler.jack_translator import JackTranslator
+from emulator.hack_cpu import HackCPU
+from sources import RecordStream, in_memory
+from vm_translator.vm_translator import VMTranslator
+
+# Results are stored from this RAM address on, well above the stack of the test program
+RESULTS = 1800
+
+# Every class has loops and branches (the compiler numbers their labels per class), and calls,
+# returns and function entries end the basic blocks of the cached top of stack
+SOURCES = {
+    'Sys': """
+class Sys {
+    function void init() {
+        var Array r;
+        var int i, s;
+        let r = 1800;
+        let r[0] = Calc.fib(12);
+        let i = 0;
+        let s = 0;
+        while (i < 20) {
+            if ((i & 1) = 0) { let s = s + Calc.square(i); } else { let s = s - i; }
+            let i = i + 1;
+        }
+        let r[1] = s;
+        do Counter.bump(5);
+        do Counter.bump(7);
+        let r[2] = Counter.total();
+        let r[3] = Calc.max(-5, 3) + Calc.max(9, 2);
+        let r[4] = (Calc.fib(5) = 5) | (3 > 4);
+        let r[5] = ~(r[1] < 0);
+        let r[6] = -r[3] - 1;
+        let r[7] = Stack.sum3(1, 2, 0);
+        let r[8] = Stack.sum3(1, 2, -1);
+        let r[9] = Stack.next(4);
+        while (true) { }
+    }
+}
+""",
+    'Calc': """
+class Calc {
+    function int fib(int n) {
+        if (n < 2) { return n; }
+        return Calc.fib(n - 1) + Calc.fib(n - 2);
+    }
+
+    function int square(int x) {
+        var int i, s;
+        let i = 0;
+        let s = 0;
+        while (i < x) { let s = s + x; let i = i + 1; }
+        return s;
+    }
+
+    function int max(int a, int b) {
+        if (a > b) { return a; }
+        return b;
+    }
+}
+""",
+    'Counter': """
+class Counter {
+    static int total;
+
+    function void bump(int n) {
+        while (n > 0) { let total = total + 1; let n = n - 1; }
+        return;
+    }
+
+    function int total() {
+        return total;
+    }
+}
+""",
+}
+
+
+# Hand-written VM code keeps values on the stack across labels and gotos, and ends a
+# function and the file with a dead push, after which the next function starts with a spill
+STACK_VM = """
+function Stack.sum3 0
+push argument 0
+label a
+push argument 1
+add
+goto b
+label b
+push argument 2
+if-goto c
+push constant 100
+add
+label c
+return
+push constant 9
+function Stack.next 0
+push argument 0
+push constant 1
+add
+return
+push constant 9
+"""
+
+
+def build_program(**translate_options):
+    """Translate the VM class and the compiled Jack classes into one image"""
+    vm_files = [in_memory(STACK_VM, 'Stack.vm')]
+    for name, source in SOURCES.items():
+        vm_code = JackTranslator(in_memory(source, f'{name}.jack'), fold_constants=True).compile()
+        vm_files.append(in_memory(vm_code, f'{name}.vm'))
+    records = VMTranslator(vm_files, **translate_options).translate_ir()
+    assembler = AsmTranslator(RecordStream('Test.asm', records, asm_ir.format_record))
+    assembler.assemble()
+    return assembler.words
+
+
+def run_program(max_cycles=1000000, **translate_options):
+    """
+    Build and run the test program
+
+    The constant 'while (true) { }' at its end is folded into an '@X; 0;JMP'
+    self-loop, where the emulator halts.
+
+    Returns:
+        Tuple of (halted, SP/LCL/ARG/THIS/THAT, static variables, results)
+    """
+    cpu = HackCPU(build_program(**translate_options))
+    cpu.run(max_cycles)
+    return cpu.halted, cpu.ram[:5], cpu.ram[16:256], cpu.ram[RESULTS:RESULTS + 10]
+
+
+class CacheTopTest(unittest.TestCase):
+    """Programs translated with and without cache_top"""
+
+    def test_cache_top_matches_plain_translation(self):
+        expected = run_program()
+        self.assertTrue(expected[0])
+        self.assertEqual(expected[3][:4], [144, 1140 - 100, 12, 12])
+        self.assertEqual(expected[3][7:], [103, 3, 5])
+        for optimize, fuse_branches, inline_constants in itertools.product((False, True), repeat=3):
+            options = {'optimize': optimize, 'fuse_branches': fuse_branches, 'inline_constants': inline_constants}
+            with self.subTest(**options):
+                self.assertEqual(run_program(cache_top=True, **options), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,22 +4,46 @@ Generates Hack assembly code from VM commands
 """
 
 from vm_translator.vm_constants import *
+from assembler import asm_ir
 
 
 class VMCodeEmitter:
     """Emits assembly code for VM commands"""
     
-    def __init__(self, output):
+    # Global call/return routines of the size-optimized mode
+    CALL_ROUTINE = '$$CALL'
+    RETURN_ROUTINE = '$$RETURN'
+    # Comparison commands that can share one routine per operator
+    COMPARISONS = ('eq', 'gt', 'lt')
+    # Jump taken when a comparison is false
+    NEGATED_JUMPS = {'eq': 'NE', 'gt': 'LE', 'lt': 'GE'}
+    # D = stack top - constant, for the constants compared in place
+    CONSTANT_DIFFERENCES = {0: 'D=M', 1: 'D=M-1', -1: 'D=M+1'}
+
+    def __init__(self, output, shared_calls=False, shared_compares=False):
         """
         Initialize code emitter with output stream
         
         Args:
-            output: Output stream for writing assembly code
+            output: Output stream for writing assembly code, or an asm_ir.IRBuffer
+                collecting IR records (no text is formatted, comments are dropped)
+            shared_calls: Route calls and returns through one global $$CALL/$$RETURN routine
+            shared_compares: Route eq/gt/lt through one global $$EQ/$$GT/$$LT routine each
         """
-        self.file = output
+        self.set_output(output)
         self.unique_num = 0
         self.source = ''
+        # Function being translated; labels are scoped to it as function$label
+        self.function = ''
         self.function_calls = {}
+        # Prefix keeping generated labels unique across separately translated files
+        self.label_prefix = ''
+        self.shared_calls = shared_calls
+        self.shared_compares = shared_compares
+        self.comparison_calls = {}
+        self.comparisons_used = set()
+        # Instructions saved against inlined call/return code (shared_calls only)
+        self.saved_instructions = 0
         
         self._write_bootstrap_code()
 
@@ -36,11 +60,60 @@ class VMCodeEmitter:
         self._write_instructions(instructions)
         # Call Sys.init
         self.write_call('Sys.init', 0)
+        if self.shared_calls:
+            self._write_shared_routines()
 
     def set_filename(self, filename):
         """Set source filename for static variables"""
         self.source = filename.split('/')[-1]
 
+    def set_output(self, output):
+        """Redirect the generated code to another output stream (or IRBuffer)"""
+        self.file = output
+        self.ir_output = isinstance(output, asm_ir.IRBuffer)
+
+    def start_fragment(self, filename):
+        """
+        Start the code of one file of a multi-file program
+        
+        Static variables are namespaced by the file name, and generated labels
+        are prefixed with it and numbered from zero, so the code of a file
+        only depends on the file itself.
+        
+        Args:
+            filename: Source filename (path without extension)
+        """
+        self.set_filename(filename)
+        self.label_prefix = f'{self.source}$'
+        self.unique_num = 0
+        self.function = ''
+        self.function_calls = {}
+        self.comparison_calls = {}
+
+    def add_cached_fragment(self, code):
+        """
+        Account for the code of a file served from a cache instead of being written
+        
+        The comparison routines a fragment calls and the instructions its
+        shared calls and returns save are read back from its code, so the
+        routines and the report match a translation of the file.
+        
+        Args:
+            code: Assembly text of the fragment
+        """
+        targets = [line.split('//')[0].strip() for line in code.split('\n')]
+        for command in self.COMPARISONS:
+            if f'@$${command.upper()}' in targets:
+                self.comparisons_used.add(command)
+        if self.shared_calls:
+            # The saving of a call or return does not depend on its operands
+            call_saving = (self.count_instructions(self._inline_call_instructions('f', 0, 'ret'))
+                           - self.count_instructions(self._shared_call_instructions('f', 0, 'ret')))
+            return_saving = (self.count_instructions(self._inline_return_instructions())
+                             - self.count_instructions(self._shared_return_instructions()))
+            self.saved_instructions += (targets.count(f'@{self.CALL_ROUTINE}') * call_saving
+                                        + targets.count(f'@{self.RETURN_ROUTINE}') * return_saving)
+
     def write_arithmetic(self, command):
         """
         Write assembly for arithmetic/logical command
@@ -49,9 +122,100 @@ class VMCodeEmitter:
             command: Arithmetic command (add, sub, neg, etc.)
         """
         self._write_comment(command)
-        instructions = self._generate_arithmetic_instructions(command, self.unique_num)
+        if self.shared_compares and command in self.COMPARISONS:
+            instructions = self._shared_comparison_call(command)
+        else:
+            instructions = self._generate_arithmetic_instructions(command, f'{self.label_prefix}{self.unique_num}')
         self._write_instructions(instructions)
 
+    def write_constant_arithmetic(self, command, value):
+        """
+        Write assembly for a binary command whose second operand is a constant
+        
+        Stands for 'push constant k' (optionally followed by 'neg') and the
+        command: the constant is applied to the stack top in place, so it is
+        never pushed.
+        
+        Args:
+            command: Arithmetic command (add, sub, and, or, or eq/gt/lt with value -1, 0 or 1)
+            value: Constant second operand
+        """
+        self._write_comment(f'{command} constant {value}')
+        if command in self.COMPARISONS:
+            instructions = self._constant_comparison_instructions(
+                command, value, f'{self.label_prefix}{self.unique_num}')
+        else:
+            instructions = self._constant_arithmetic_instructions(command, value)
+        self._write_instructions(instructions)
+
+    @staticmethod
+    def _constant_arithmetic_instructions(command, value):
+        """Generate the in-place add/sub/and/or of a constant (-32767..32767)"""
+        if command == 'sub':
+            command, value = 'add', -value
+        top = ['\t@SP', '\tA=M-1']
+        if command == 'add':
+            if value == 0:
+                return []
+            if value in (1, -1):
+                return top + ['\tM=M+1' if value == 1 else '\tM=M-1']
+            return [f'\t@{abs(value)}', '\tD=A'] + top + ['\tM=M+D' if value > 0 else '\tM=M-D']
+        operator = '&' if command == 'and' else '|'
+        if value == (-1 if command == 'and' else 0):
+            return []
+        if value == (0 if command == 'and' else -1):
+            return top + [f'\tM={value}']
+        return [f'\t@{abs(value)}', '\tD=A' if value > 0 else '\tD=-A'] + top + [f'\tM=M{operator}D']
+
+    @staticmethod
+    def _constant_comparison_instructions(command, value, unique_num):
+        """Generate the in-place comparison of the stack top with -1, 0 or 1"""
+        label = f'{command.upper()}_{unique_num}'
+        return [
+            '\t@SP', '\tA=M-1', '\t' + VMCodeEmitter.CONSTANT_DIFFERENCES[value], '\tM=-1', f'\t@{label}', f'\tD;J{command.upper()}',
+            '\t@SP', '\tA=M-1', '\tM=0', f'({label})'
+        ]
+
+    def _shared_comparison_call(self, command):
+        """
+        Generate a call of the shared routine of a comparison command
+        
+        Args:
+            command: Comparison command (eq, gt or lt)
+            
+        Returns:
+            Instructions passing the return address in R15
+        """
+        routine = f'$${command.upper()}'
+        call_num = self.comparison_calls.get(command, 0)
+        self.comparison_calls[command] = call_num + 1
+        self.comparisons_used.add(command)
+        return_address = f'{self.label_prefix}{routine}$ret.{call_num}'
+        return [
+            f'\t@{return_address}', '\tD=A', '\t@R15', '\tM=D\t\t// R15 = return address',
+            f'\t@{routine}', '\t0;JMP', f'({return_address})'
+        ]
+
+    def write_comparison_routines(self):
+        """
+        Write the shared routine of every comparison command used so far
+        
+        A routine pops y, replaces x on the stack top with x <op> y (-1 or 0)
+        and jumps back to the address in R15.
+        """
+        for command in self.COMPARISONS:
+            if command not in self.comparisons_used:
+                continue
+            routine = f'$${command.upper()}'
+            self._write_comment(f'{routine}: R15 = return address')
+            instructions = [
+                f'({routine})', '\t@SP', '\tAM=M-1', '\tD=M', '\tA=A-1', '\tD=M-D', '\tM=-1',
+                f'\t@{routine}$true', f'\tD;J{command.upper()}',
+                '\t@SP', '\tA=M-1', '\tM=0',
+                f'({routine}$true)', '\t@R15', '\tA=M', '\t0;JMP'
+            ]
+            self._write_instructions(instructions)
+
     def write_push_pop(self, command, segment, index):
         """
         Write assembly for push/pop command
@@ -91,22 +255,60 @@ class VMCodeEmitter:
                 instructions = ['\t\n'.join(stack_to_d), '\t\n'.join(d_to_seg).format(seg=mem_seg)]
             self._write_instructions(instructions)
 
+    def scoped_label(self, label):
+        """
+        Get the assembly symbol of a VM label
+        
+        VM labels are local to their function, so they are emitted as
+        function$label (labels outside any function are kept as they are).
+        
+        Args:
+            label: VM label
+            
+        Returns:
+            Assembly symbol
+        """
+        return f'{self.function}${label}' if self.function else label
+
     def write_label(self, label):
         """Write assembly for label command"""
         self._write_comment(f'label {label}')
-        instructions = [f'({label})']
+        instructions = [f'({self.scoped_label(label)})']
         self._write_instructions(instructions)
 
     def write_goto(self, label):
         """Write assembly for goto command"""
         self._write_comment(f'goto {label}')
-        instructions = [f'\t@{label}', '\t0;JMP']
+        instructions = [f'\t@{self.scoped_label(label)}', '\t0;JMP']
         self._write_instructions(instructions)
 
     def write_if(self, label):
         """Write assembly for if-goto command"""
         self._write_comment(f'if-goto {label}')
-        instructions = ['\t@SP', '\tAM=M-1', '\tD=M', f'\t@{label}', '\tD;JNE']
+        instructions = ['\t@SP', '\tAM=M-1', '\tD=M', f'\t@{self.scoped_label(label)}', '\tD;JNE']
+        self._write_instructions(instructions)
+
+    def write_compare_branch(self, label, command, negated=False, value=None):
+        """
+        Write assembly for a comparison consumed by an if-goto
+        
+        Stands for 'eq'/'gt'/'lt', optionally followed by 'not', and the
+        'if-goto': the jump tests the difference of the operands directly,
+        so the -1/0 result is never materialized.
+        
+        Args:
+            label: Jump target
+            command: Comparison command (eq, gt or lt)
+            negated: Jump when the comparison is false
+            value: Constant second operand (-1, 0 or 1), None if it is on the stack
+        """
+        jump = self.NEGATED_JUMPS[command] if negated else command.upper()
+        self._write_comment(f'if-goto {label} on {"not " if negated else ""}{command}')
+        if value is None:
+            instructions = ['\t@SP', '\tAM=M-1', '\tD=M', '\t@SP', '\tAM=M-1', '\tD=M-D']
+        else:
+            instructions = ['\t@SP', '\tAM=M-1', '\t' + self.CONSTANT_DIFFERENCES[value]]
+        instructions += [f'\t@{self.scoped_label(label)}', f'\tD;J{jump}']
         self._write_instructions(instructions)
 
     def write_function(self, function, local_variables):
@@ -117,6 +319,7 @@ class VMCodeEmitter:
             function: Function name
             local_variables: Number of local variables
         """
+        self.function = function
         self._write_comment(f'function {function} {local_variables}')
         instructions = [f'({function})', '\t@SP', '\tD=M', '\t@LCL', '\tM=D']
         for _ in range(local_variables):
@@ -138,8 +341,27 @@ class VMCodeEmitter:
         except (KeyError):
             self.function_calls[function] = 0
             call_num = 0
-        return_address = f'{function}$ret.{call_num}'
-        instructions = [
+        return_address = f'{self.label_prefix}{function}$ret.{call_num}'
+        instructions = self._inline_call_instructions(function, num_arguments, return_address)
+        if self.shared_calls:
+            shared = self._shared_call_instructions(function, num_arguments, return_address)
+            self.saved_instructions += self.count_instructions(instructions) - self.count_instructions(shared)
+            instructions = shared
+        self._write_instructions(instructions)
+
+    def _shared_call_instructions(self, function, num_arguments, return_address):
+        """Generate the calling sequence of a function call through the shared $$CALL routine"""
+        return [
+            f'\t@{num_arguments}', '\tD=A', '\t@R14', '\tM=D\t\t// R14 = n_args',
+            f'\t@{function}', '\tD=A', '\t@R13', '\tM=D\t\t// R13 = function',
+            f'\t@{return_address}', '\tD=A\t\t// D = return address',
+            f'\t@{self.CALL_ROUTINE}', '\t0;JMP',
+            f'({return_address})'
+        ]
+
+    def _inline_call_instructions(self, function, num_arguments, return_address):
+        """Generate the inlined calling sequence of a function call"""
+        return [
             f'\t@{return_address}', '\tD=A', '\t@SP', '\tM=M+1', '\tA=M-1', '\tM=D',
             f'\t//Function Call: Save Caller State',
             self._push_segment('LCL'), self._push_segment('ARG'),
@@ -151,7 +373,36 @@ class VMCodeEmitter:
             f'\t@{function}\t//Jump to function {function}', '\t0;JMP',
             f'({return_address})'
         ]
-        self._write_instructions(instructions)
+
+    def _write_shared_routines(self):
+        """
+        Write the global call and return routines of the size-optimized mode
+        
+        $$CALL expects the return address in D, the function address in R13
+        and the number of arguments in R14. $$RETURN is the inlined return
+        sequence, jumped to by every return command.
+        """
+        self._write_comment(f'{self.CALL_ROUTINE}: D = return address, R13 = function, R14 = n_args')
+        call = [
+            f'({self.CALL_ROUTINE})', '\t@SP', '\tM=M+1', '\tA=M-1', '\tM=D\t\t// Push return address',
+            self._push_segment('LCL'), self._push_segment('ARG'),
+            self._push_segment('THIS'), self._push_segment('THAT'),
+            '\t@R14', '\tD=M', '\t@5', '\tD=D+A', '\t@SP', '\tD=M-D\t// ARG = SP - 5 - n_args',
+            '\t@ARG', '\tM=D\t\t// Reposition ARG',
+            '\t@SP', '\tD=M', '\t@LCL', '\tM=D\t\t// Reposition LCL',
+            '\t@R13', '\tA=M\t\t// Jump to function', '\t0;JMP'
+        ]
+        self._write_instructions(call)
+        self._write_comment(self.RETURN_ROUTINE)
+        ret = [f'({self.RETURN_ROUTINE})'] + self._inline_return_instructions()
+        self._write_instructions(ret)
+        self.saved_instructions -= self.count_instructions(call) + self.count_instructions(ret)
+
+    @staticmethod
+    def count_instructions(instructions):
+        """Count the A/C-instructions of a generated instruction list"""
+        lines = '\n'.join(instructions).split('\n')
+        return sum(1 for line in lines if line.split('//')[0].strip() and not line.strip().startswith('('))
 
     @staticmethod
     def _push_segment(segment):
@@ -165,7 +416,21 @@ class VMCodeEmitter:
     def write_return(self):
         """Write assembly for return command"""
         self._write_comment('return')
-        instructions = [
+        instructions = self._inline_return_instructions()
+        if self.shared_calls:
+            shared = self._shared_return_instructions()
+            self.saved_instructions += self.count_instructions(instructions) - self.count_instructions(shared)
+            instructions = shared
+        self._write_instructions(instructions)
+
+    def _shared_return_instructions(self):
+        """Generate the jump to the shared $$RETURN routine"""
+        return [f'\t@{self.RETURN_ROUTINE}', '\t0;JMP']
+
+    @staticmethod
+    def _inline_return_instructions():
+        """Generate the inlined return sequence"""
+        return [
             '\t@LCL', '\tD=M', '\t@R13', '\tM=D',
             '\t@5', '\tA=D-A', '\tD=M', '\t@R14', '\tM=D',
             '\t@SP', '\tA=M-1', '\tD=M', '\t@ARG', '\tA=M', '\tM=D',
@@ -176,7 +441,6 @@ class VMCodeEmitter:
             '\t@R13', '\tAM=M-1', '\tD=M', '\t@LCL', '\tM=D',
             '\t@R14', '\tA=M', '\t0;JMP'
         ]
-        self._write_instructions(instructions)
 
     @staticmethod
     def _generate_arithmetic_instructions(command, unique_num):
@@ -229,15 +493,245 @@ class VMCodeEmitter:
         return seg_to_d, d_to_stack, stack_to_d, d_to_seg
 
     def _write_comment(self, comment):
-        """Write comment line to output"""
-        self.file.write(f'\t// {comment}\n')
+        """Write comment line to output (IR records have no comments)"""
+        if not self.ir_output:
+            self.file.write(f'\t// {comment}\n')
 
     def _write_instructions(self, instructions):
-        """Write instructions to output"""
-        self.file.write('\n'.join(instructions) + '\n')
+        """Write instructions to output, as text or as IR records"""
+        if self.ir_output:
+            self.file.write_instructions(instructions)
+        else:
+            self.file.write('\n'.join(instructions) + '\n')
         self.unique_num += 1
 
     def close(self):
         """Close output file if applicable"""
         if hasattr(self.file, 'close'):
             self.file.close()
+
+
+class VMCachedTopEmitter(VMCodeEmitter):
+    """
+    Emits assembly keeping the top of the VM stack in the D register
+
+    Within a basic block the top value stays in D instead of being stored
+    through @SP and loaded again by the next command. It is spilled to the
+    stack before labels, gotos, calls, returns and function entries, so every
+    jump target sees the plain stack. Commands without a D-aware form spill
+    first and run the stack code of VMCodeEmitter.
+    """
+
+    # Largest segment index reached by walking the base pointer
+    max_pointer_walk = 7
+    # Base pointers of the segments addressed through them
+    SEGMENT_POINTERS = {'local': 'LCL', 'argument': 'ARG', 'this': 'THIS', 'that': 'THAT'}
+    # D = x <op> D for binary commands, with x on the stack
+    BINARY_OPERATIONS = {'add': 'D=D+M', 'sub': 'D=M-D', 'and': 'D=D&M', 'or': 'D=D|M'}
+
+    def __init__(self, output, shared_calls=False, shared_compares=False):
+        """
+        Initialize code emitter with output stream
+
+        Args:
+            output: Output stream for writing assembly code
+            shared_calls: Route calls and returns through one global $$CALL/$$RETURN routine
+            shared_compares: Route eq/gt/lt through one global $$EQ/$$GT/$$LT routine each
+        """
+        # The bootstrap code is written by the base initializer
+        self.top_in_d = False
+        super().__init__(output, shared_calls=shared_calls, shared_compares=shared_compares)
+
+    def spill(self):
+        """Store a top value held in D on the stack"""
+        if self.top_in_d:
+            self.top_in_d = False
+            self._write_instructions(['\t@SP', '\tM=M+1', '\tA=M-1', '\tM=D'])
+
+    def _top_to_d(self):
+        """Get the instructions moving the top value into D (and off the stack)"""
+        if self.top_in_d:
+            return []
+        return ['\t@SP', '\tAM=M-1', '\tD=M']
+
+    def _segment_address(self, segment, index):
+        """
+        Generate code pointing A at a segment entry without touching D
+
+        Returns:
+            Instructions, or None if the index is too large to walk to
+        """
+        if segment == 'static':
+            return [f'\t@{self.source}.{index}']
+        if segment == 'temp':
+            return [f'\t@{5 + index}']
+        if segment == 'pointer':
+            return ['\t@THIS' if index == 0 else '\t@THAT']
+        if index > self.max_pointer_walk:
+            return None
+        pointer = f'\t@{self.SEGMENT_POINTERS[segment]}'
+        if index == 0:
+            return [pointer, '\tA=M']
+        return [pointer, '\tA=M+1'] + ['\tA=A+1'] * (index - 1)
+
+    def write_push_pop(self, command, segment, index):
+        """
+        Write assembly for push/pop command
+
+        A push spills the previous top value and loads the new one into D;
+        a pop stores D into the segment.
+
+        Args:
+            command: C_PUSH or C_POP
+            segment: Memory segment
+            index: Segment index
+        """
+        if command == C_PUSH:
+            self.spill()
+            self._write_comment(f'push {segment}[{index}] -> D')
+            if segment == 'constant':
+                instructions = [f'\t@{index}', '\tD=A']
+            else:
+                address = self._segment_address(segment, index)
+                if address is not None and len(address) <= 3:
+                    instructions = address + ['\tD=M']
+                else:
+                    seg_to_d = self._generate_push_pop_snippets(segment, index)[0]
+                    instructions = ['\t\n'.join(seg_to_d).format(seg=self.SEGMENT_POINTERS.get(segment))]
+            self.top_in_d = True
+        else:
+            self._write_comment(f'pop D -> {segment}[{index}]')
+            instructions = self._top_to_d()
+            address = self._segment_address(segment, index)
+            if address is not None:
+                instructions += address + ['\tM=D']
+            else:
+                d_to_seg = self._generate_push_pop_snippets(segment, index)[3]
+                instructions.append('\t\n'.join(d_to_seg).format(seg=self.SEGMENT_POINTERS[segment]))
+            self.top_in_d = False
+        self._write_instructions(instructions)
+
+    def write_arithmetic(self, command):
+        """
+        Write assembly for arithmetic/logical command, leaving the result in D
+
+        Args:
+            command: Arithmetic command (add, sub, neg, etc.)
+        """
+        if self.shared_compares and command in self.COMPARISONS:
+            self.spill()
+            super().write_arithmetic(command)
+            return
+        self._write_comment(f'{command} -> D')
+        if command == 'neg' or command == 'not':
+            operation = '-' if command == 'neg' else '!'
+            if self.top_in_d:
+                instructions = [f'\tD={operation}D']
+            else:
+                instructions = ['\t@SP', '\tAM=M-1', f'\tD={operation}M']
+        else:
+            instructions = self._top_to_d() + ['\t@SP', '\tAM=M-1']
+            if command in self.BINARY_OPERATIONS:
+                instructions.append('\t' + self.BINARY_OPERATIONS[command])
+            else:
+                instructions += ['\tD=M-D'] + self._materialize_comparison(
+                    command, f'{self.label_prefix}{self.unique_num}')
+        self.top_in_d = True
+        self._write_instructions(instructions)
+
+    def write_constant_arithmetic(self, command, value):
+        """
+        Write assembly for a binary command whose second operand is a constant
+
+        Args:
+            command: Arithmetic command (add, sub, and, or, or eq/gt/lt with value -1, 0 or 1)
+            value: Constant second operand
+        """
+        self._write_comment(f'{command} constant {value} -> D')
+        instructions = self._top_to_d()
+        if command == 'sub':
+            command, value = 'add', -value
+        if command in self.COMPARISONS:
+            difference = self.CONSTANT_DIFFERENCES[value].replace('M', 'D')
+            if difference != 'D=D':
+                instructions.append('\t' + difference)
+            instructions += self._materialize_comparison(command, f'{self.label_prefix}{self.unique_num}')
+        elif command == 'add':
+            if value in (1, -1):
+                instructions.append('\tD=D+1' if value == 1 else '\tD=D-1')
+            elif value:
+                instructions += [f'\t@{abs(value)}', '\tD=D+A' if value > 0 else '\tD=D-A']
+        else:
+            operator = '&' if command == 'and' else '|'
+            if value == (0 if command == 'and' else -1):
+                instructions.append(f'\tD={value}')
+            elif value == (-1 if command == 'and' else 0):
+                pass
+            elif value > 0:
+                instructions += [f'\t@{value}', f'\tD=D{operator}A']
+            else:
+                instructions += ['\t@R13', '\tM=D', f'\t@{-value}', '\tD=-A', '\t@R13', f'\tD=D{operator}M']
+        self.top_in_d = True
+        self._write_instructions(instructions)
+
+    @staticmethod
+    def _materialize_comparison(command, unique_num):
+        """Generate the code turning the difference in D into -1 (true) or 0 in D"""
+        label = f'{command.upper()}_{unique_num}'
+        return [
+            f'\t@{label}', f'\tD;J{command.upper()}', '\tD=0', f'\t@FINALIZE_{unique_num}', '\t0;JMP',
+            f'({label})', '\tD=-1', f'(FINALIZE_{unique_num})'
+        ]
+
+    def write_compare_branch(self, label, command, negated=False, value=None):
+        """
+        Write assembly for a comparison consumed by an if-goto
+
+        Args:
+            label: Jump target
+            command: Comparison command (eq, gt or lt)
+            negated: Jump when the comparison is false
+            value: Constant second operand (-1, 0 or 1), None if it is on the stack
+        """
+        jump = self.NEGATED_JUMPS[command] if negated else command.upper()
+        self._write_comment(f'if-goto {label} on {"not " if negated else ""}{command}')
+        instructions = self._top_to_d()
+        if value is None:
+            instructions += ['\t@SP', '\tAM=M-1', '\tD=M-D']
+        elif value:
+            instructions.append('\t' + self.CONSTANT_DIFFERENCES[value].replace('M', 'D'))
+        instructions += [f'\t@{self.scoped_label(label)}', f'\tD;J{jump}']
+        self.top_in_d = False
+        self._write_instructions(instructions)
+
+    def write_if(self, label):
+        """Write assembly for if-goto command, jumping on D"""
+        self._write_comment(f'if-goto {label}')
+        instructions = self._top_to_d() + [f'\t@{self.scoped_label(label)}', '\tD;JNE']
+        self.top_in_d = False
+        self._write_instructions(instructions)
+
+    def write_label(self, label):
+        """Write assembly for label command"""
+        self.spill()
+        super().write_label(label)
+
+    def write_goto(self, label):
+        """Write assembly for goto command"""
+        self.spill()
+        super().write_goto(label)
+
+    def write_function(self, function, local_variables):
+        """Write assembly for function declaration"""
+        self.spill()
+        super().write_function(function, local_variables)
+
+    def write_call(self, function, num_arguments):
+        """Write assembly for function call"""
+        self.spill()
+        super().write_call(function, num_arguments)
+
+    def write_return(self):
+        """Write assembly for return command"""
+        self.spill()
+        super().write_return()
@@ -4,124 +4,120 @@ Parses VM code commands and extracts command components
 """
 
 from vm_translator.vm_constants import *
+from sources import read_source
 
 
 class VMParser:
     """Parser for VM code"""
-    
+
+    # Command type of each command keyword
+    _command_types = {
+        'add': C_ARITHMETIC, 'sub': C_ARITHMETIC, 'neg': C_ARITHMETIC,
+        'eq': C_ARITHMETIC, 'gt': C_ARITHMETIC, 'lt': C_ARITHMETIC,
+        'and': C_ARITHMETIC, 'or': C_ARITHMETIC, 'not': C_ARITHMETIC,
+        'push': C_PUSH, 'pop': C_POP,
+        'label': C_LABEL, 'goto': C_GOTO, 'if-goto': C_IF,
+        'function': C_FUNCTION, 'call': C_CALL, 'return': C_RETURN,
+    }
+
     def __init__(self, filename):
         """
         Initialize parser with VM file
-        
+
+        The whole file is read at once and every line is split and classified
+        a single time into a (command, command_type, arg1, arg2) record.
+
         Args:
-            filename: Path to VM source file
+            filename: Path to VM source file or in-memory text stream
         """
-        self.file = open(filename, 'r')
+        self.commands = self.parse(read_source(filename))
+        self._position = 0
+        self._record = None
         self.current_command = ''
 
-    def __del__(self):
-        """Close file on cleanup"""
-        self.file.close()
+    @classmethod
+    def parse(cls, source):
+        """
+        Split VM source into command records
+
+        Args:
+            source: VM code as string
+
+        Returns:
+            List of (command, command_type, arg1, arg2) tuples
+        """
+        commands = []
+        for line in source.splitlines():
+            command = cls.parse_line(line)
+            if command is not None:
+                commands.append(command)
+        return commands
+
+    @classmethod
+    def parse_line(cls, line):
+        """
+        Split one line of VM source into a command record
+
+        Args:
+            line: VM source line
+
+        Returns:
+            (command, command_type, arg1, arg2) tuple, None for blank/comment lines
+        """
+        fields = line.split('/', 1)[0].split()
+        if not fields:
+            return None
+        command_type = cls._command_types.get(fields[0])
+        if command_type == C_ARITHMETIC:
+            arg1 = fields[0]
+        else:
+            arg1 = fields[1] if len(fields) > 1 else ''
+        arg2 = int(fields[2]) if len(fields) > 2 else None
+        return ' '.join(fields), command_type, arg1, arg2
+
+    @staticmethod
+    def format(command):
+        """Format a command record as a line of VM source"""
+        return command[0] + '\n'
 
     def advance(self):
         """
         Advance to next command
-        
+
         Returns:
             True if command found, False if end of file
         """
-        self.current_command = ''
-        while char := self.file.read(1):
-            if char == ' ':
-                if not self.current_command:
-                    continue
-            elif char == '/':
-                if self.current_command:
-                    self._format_cmd()
-                    return True
-                self.file.readline()
-                continue
-            elif char == '\n':
-                if self.current_command:
-                    self._format_cmd()
-                    return True
-                continue
-            self.current_command += char
-        return False
-
-    def _format_cmd(self):
-        """Remove trailing spaces from command"""
-        for i in range(len(self.current_command) - 1, 0, -1):
-            if self.current_command[i] != ' ':
-                return
-            self.current_command = self.current_command[:i]
+        if self._position >= len(self.commands):
+            self.current_command = ''
+            return False
+        self._record = self.commands[self._position]
+        self._position += 1
+        self.current_command = self._record[0]
+        return True
 
     def command_type(self):
         """
         Get type of current command
-        
+
         Returns:
             Command type constant (C_ARITHMETIC, C_PUSH, etc.)
         """
-        arithmetic_cmds = ['add', 'sub', 'neg', 'eq', 'gt', 'lt', 'and', 'or', 'not']
-        if self.current_command in arithmetic_cmds:
-            return C_ARITHMETIC
-        if self.current_command.startswith('push'):
-            return C_PUSH
-        if self.current_command.startswith('pop'):
-            return C_POP
-        if self.current_command.startswith('label'):
-            return C_LABEL
-        if self.current_command.startswith('goto'):
-            return C_GOTO
-        if self.current_command.startswith('if-goto'):
-            return C_IF
-        if self.current_command.startswith('function'):
-            return C_FUNCTION
-        if self.current_command.startswith('call'):
-            return C_CALL
-        if self.current_command.startswith('return'):
-            return C_RETURN
+        return self._record[1]
 
     def arg1(self):
         """
         Get first argument of command
-        
+
         Returns:
             First argument string
         """
-        if self.command_type() == C_ARITHMETIC:
-            return self.current_command
-        return self._get_cmd_field(2)
+        return self._record[2]
 
     def arg2(self):
         """
         Get second argument of command
-        
-        Returns:
-            Second argument as integer
-        """
-        return int(self._get_cmd_field(3))
 
-    def _get_cmd_field(self, field_num):
-        """
-        Extract specific field from command
-        
-        Args:
-            field_num: Field number to extract (1-indexed)
-            
         Returns:
-            Field value as string
+            Second argument as integer
         """
-        field_str = ''
-        current_field = 0
-        inside_field = False
-        for char in self.current_command:
-            if not inside_field and char != ' ':
-                current_field += 1
-                inside_field = True
-            elif inside_field and char == ' ':
-                inside_field = False
-            if inside_field and current_field == field_num:
-                field_str += char
-        return field_str
+        return self._record[3]
@@ -0,0 +1,238 @@
+"""
+VM Peephole Optimizer
+Rewrites the assembly emitted by VMCodeEmitter into shorter equivalent sequences
+"""
+
+import re
+from assembler import asm_ir
+
+
+class VMPeepholeOptimizer:
+    """Peephole optimizer over a structured list of Hack assembly instructions"""
+
+    # Instruction kinds of the assembler IR
+    A_INSTRUCTION = asm_ir.A_INSTRUCTION
+    C_INSTRUCTION = asm_ir.C_INSTRUCTION
+    L_INSTRUCTION = asm_ir.L_INSTRUCTION
+
+    # Stack snippets of VMCodeEmitter
+    _push_d = ['@SP', 'M=M+1', 'A=M-1', 'M=D']
+    _pop_d = ['@SP', 'M=M-1', 'A=M', 'D=M']
+
+    # pop to a segment through R13/R14 (d_to_seg)
+    _pop_through_temp = re.compile(
+        r'@R13 M=D @(\d+) D=A @(\w+) D=D\+([AM]) @R14 M=D @R13 D=M @R14 A=M M=D'
+    )
+    # push from a segment (seg_to_d)
+    _push_from_segment = re.compile(r'@(\d+) D=A @(\w+) A=D\+([AM]) D=M')
+
+    # M=<f(D)> followed by M=<g(M)> -> M=<g(f(D))>
+    _unary_of_d = {
+        'M=D': {'M=-M': 'M=-D', 'M=!M': 'M=!D'},
+        'M=-D': {'M=-M': 'M=D', 'M=!M': 'M=D-1'},
+        'M=!D': {'M=-M': 'M=D+1', 'M=!M': 'M=D'},
+    }
+
+    # Largest segment index popped by walking the base pointer instead of R13/R14
+    max_pointer_walk = 7
+
+    def __init__(self):
+        """Initialize optimizer statistics"""
+        self.instructions_before = 0
+        self.instructions_after = 0
+
+    @staticmethod
+    def parse(asm_code):
+        """
+        Parse assembly text into a structured instruction list
+
+        Args:
+            asm_code: Hack assembly source
+
+        Returns:
+            List of assembler IR (kind, text) tuples with comments and whitespace removed
+        """
+        return asm_ir.parse_text(asm_code)
+
+    @staticmethod
+    def format(instructions):
+        """
+        Format a structured instruction list as assembly text
+
+        Args:
+            instructions: List of assembler IR (kind, text) tuples
+
+        Returns:
+            Hack assembly source
+        """
+        return asm_ir.format_records(instructions)
+
+    @staticmethod
+    def _as_text(instruction):
+        """Get the source form of a structured instruction"""
+        kind, text = instruction
+        return '@' + text if kind == VMPeepholeOptimizer.A_INSTRUCTION else text
+
+    @staticmethod
+    def _is_m_store(text):
+        """Check if a C-instruction only writes M and does not jump"""
+        return text.startswith('M=') and ';' not in text
+
+    @staticmethod
+    def _is_d_store(text):
+        """Check if a C-instruction writes M from a computation of D and constants only"""
+        return text.startswith('M=') and ';' not in text and not re.search('[AM]', text[2:])
+
+    @staticmethod
+    def _dest(text):
+        """Get the dest field of a C-instruction"""
+        return text.split('=')[0] if '=' in text else ''
+
+    def _rewrite_window(self, window):
+        """
+        Rewrite a window of instruction texts that starts at the current position
+
+        Args:
+            window: Source form of the next instructions (no labels)
+
+        Returns:
+            Tuple of (consumed_count, replacement_texts) or None if no rule applies
+        """
+        # push D immediately popped again: the value is still in D
+        if window[:8] == self._push_d + self._pop_d:
+            return 8, ['@SP', 'A=M']
+        # single/double operand prep: A = SP - 1
+        if window[:3] == ['@SP', 'A=M', 'A=A-1']:
+            return 3, ['@SP', 'A=M-1']
+        # pop: decrement SP and address the popped slot in one instruction
+        if window[:3] == ['@SP', 'M=M-1', 'A=M']:
+            return 3, ['@SP', 'AM=M-1']
+        # the stack top is written and then popped again into D
+        if (len(window) >= 7 and window[:3] == ['@SP', 'M=M+1', 'A=M-1'] and self._is_d_store(window[3])
+                and window[4:7] == ['@SP', 'AM=M-1', 'D=M']):
+            return 7, ['D=' + window[3][2:], '@SP', 'A=M']
+        if (len(window) >= 6 and window[:2] == ['@SP', 'A=M-1'] and self._is_d_store(window[2])
+                and window[3:6] == ['@SP', 'AM=M-1', 'D=M']):
+            return 6, ['@SP', 'AM=M-1', 'D=' + window[2][2:]]
+        # A still addresses the stack top after writing it
+        if (len(window) >= 6 and window[:3] == ['@SP', 'M=M+1', 'A=M-1'] and self._is_m_store(window[3])
+                and window[4:6] == ['@SP', 'A=M-1']):
+            return 6, window[:4]
+        if (len(window) >= 5 and window[:2] == ['@SP', 'A=M-1'] and self._is_m_store(window[2])
+                and window[3:5] == ['@SP', 'A=M-1']):
+            return 5, window[:3]
+        # unary operation applied to a value just stored from D
+        if len(window) >= 2 and window[0] in self._unary_of_d and window[1] in self._unary_of_d[window[0]]:
+            return 2, [self._unary_of_d[window[0]][window[1]]]
+        # compute into D and store: one instruction with two destinations
+        if len(window) >= 2 and window[1] == 'M=D' and re.fullmatch(r'D=[^;]+', window[0]):
+            return 2, ['MD=' + window[0][2:]]
+        # push from temp or a small segment index: no index arithmetic in D
+        # (before the constant rule, which would take the '@0/@1 D=A' prefix)
+        match = self._push_from_segment.fullmatch(' '.join(window[:5]))
+        if match:
+            index, segment, base = int(match.group(1)), match.group(2), match.group(3)
+            if base == 'A':
+                return 5, [f'@{int(segment) + index}', 'D=M']
+            if index <= 1:
+                return 5, [f'@{segment}', 'A=M' if index == 0 else 'A=M+1', 'D=M']
+        # constants 0 and 1 need no A-instruction
+        if window[:2] in (['@0', 'D=A'], ['@1', 'D=A']):
+            return 2, ['D=' + window[0][1:]]
+
+        joined = ' '.join(window[:13])
+        match = self._pop_through_temp.match(joined)
+        if match:
+            index, segment, base = int(match.group(1)), match.group(2), match.group(3)
+            if base == 'A':
+                return 13, [f'@{int(segment) + index}', 'M=D']
+            if index <= self.max_pointer_walk:
+                return 13, [f'@{segment}', 'A=M'] + ['A=A+1'] * index + ['M=D']
+        return None
+
+    def _rewrite_patterns(self, instructions):
+        """Apply the window rewrite rules once over the whole list"""
+        result = []
+        i = 0
+        while i < len(instructions):
+            window = []
+            for instruction in instructions[i:i + 13]:
+                if instruction[0] == self.L_INSTRUCTION:
+                    break
+                window.append(self._as_text(instruction))
+            rewrite = self._rewrite_window(window) if window else None
+            if rewrite is None:
+                result.append(instructions[i])
+                i += 1
+                continue
+            consumed, replacement = rewrite
+            result.extend(self.parse('\n'.join(replacement)))
+            i += consumed
+        return result
+
+    def _remove_dead_loads(self, instructions):
+        """
+        Remove A-register loads whose value is never used
+
+        An A-instruction is dead when the A register already holds the same
+        symbol, or when it is immediately followed by another A-instruction.
+        A C-instruction that only writes A (without jumping) is dead when an
+        A-instruction follows it.
+        """
+        result = []
+        known_a = None
+        for index, (kind, text) in enumerate(instructions):
+            following = instructions[index + 1] if index + 1 < len(instructions) else None
+            next_is_a = following is not None and following[0] == self.A_INSTRUCTION
+            if kind == self.L_INSTRUCTION:
+                known_a = None
+            elif kind == self.A_INSTRUCTION:
+                if text == known_a or next_is_a:
+                    continue
+                known_a = text
+            else:
+                dest = self._dest(text)
+                if dest == 'A' and ';' not in text and next_is_a:
+                    continue
+                if 'A' in dest:
+                    known_a = None
+            result.append((kind, text))
+        return result
+
+    def optimize(self, instructions):
+        """
+        Optimize a structured instruction list until no rule applies
+
+        Args:
+            instructions: List of (kind, text) tuples
+
+        Returns:
+            Optimized list of (kind, text) tuples
+        """
+        self.instructions_before += sum(1 for kind, _ in instructions if kind != self.L_INSTRUCTION)
+        while True:
+            optimized = self._remove_dead_loads(self._rewrite_patterns(instructions))
+            if optimized == instructions:
+                break
+            instructions = optimized
+        self.instructions_after += sum(1 for kind, _ in instructions if kind != self.L_INSTRUCTION)
+        return instructions
+
+    def optimize_code(self, asm_code):
+        """
+        Optimize assembly text
+
+        Args:
+            asm_code: Hack assembly source emitted by VMCodeEmitter
+
+        Returns:
+            Optimized Hack assembly source (comments are dropped)
+        """
+        return self.format(self.optimize(self.parse(asm_code)))
+
+    def report(self):
+        """Get a summary of the instruction count reduction"""
+        saved = self.instructions_before - self.instructions_after
+        percent = 100 * saved / self.instructions_before if self.instructions_before else 0
+        return (f'peephole: {self.instructions_before} -> {self.instructions_after} instructions '
+                f'({percent:.1f}% smaller)')
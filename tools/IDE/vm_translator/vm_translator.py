@@ -6,21 +6,51 @@ Translates VM code to Hack assembly language
 import os
 import io
 from vm_translator.vm_parser import VMParser
-from vm_translator.vm_code_emitter import VMCodeEmitter
+from vm_translator.vm_code_emitter import VMCodeEmitter, VMCachedTopEmitter
+from vm_translator.vm_peephole import VMPeepholeOptimizer
 from vm_translator.vm_constants import *
+from assembler import asm_ir
+from sources import RecordStream, is_stream, source_name
 
 
 class VMTranslator:
     """Translator for VM code to assembly"""
     
-    def __init__(self, filepath):
+    # Binary commands that take any constant second operand in place
+    CONSTANT_OPERAND_COMMANDS = ('add', 'sub', 'and', 'or')
+    # Comparisons take -1, 0 and 1 in place
+    CONSTANT_COMPARISON_VALUES = (-1, 0, 1)
+
+    def __init__(self, filepath, optimize=False, shared_calls=False, shared_compares=False,
+                 inline_constants=False, fuse_branches=False, cache_top=False):
         """
         Initialize translator with VM file
         
         Args:
-            filepath: Path to VM source file
+            filepath: VM source (path or in-memory text stream), a directory or a list of VM sources
+            optimize: Run the peephole optimizer over the emitted assembly
+            shared_calls: Emit calls and returns through global $$CALL/$$RETURN routines
+            shared_compares: Emit eq/gt/lt through one global routine per operator
+            inline_constants: Fuse 'push constant k' with the following add/sub/and/or
+                (and eq/gt/lt for k in -1, 0, 1) into one in-place operation
+            fuse_branches: Jump on the operands of 'eq/gt/lt [not] if-goto' without
+                materializing the comparison result
+            cache_top: Keep the top of the stack in D within basic blocks (VMCachedTopEmitter)
         """
         self.filepath = filepath
+        self.filepaths = self.collect_files(filepath)
+        # Per-file code is namespaced unless a single file is translated on its own
+        self.multi_file = isinstance(filepath, (list, tuple)) or (not is_stream(filepath) and os.path.isdir(filepath))
+        self.fragments = {}
+        self.shared_calls = shared_calls
+        self.shared_compares = shared_compares
+        self.inline_constants = inline_constants
+        self.fuse_branches = fuse_branches
+        self.cache_top = cache_top
+        # Instruction counts of the shared-calls report, set by a translation
+        self._emitted = 0
+        self._saved_instructions = None
+        self.optimizer = VMPeepholeOptimizer() if optimize else None
 
     @staticmethod
     def parse_filename(file):
@@ -36,41 +66,345 @@ class VMTranslator:
         filename, ext = os.path.splitext(file)
         return filename, ext.lstrip('.')
 
-    def translate(self):
+    @staticmethod
+    def collect_files(filepath):
+        """
+        List the VM files to translate
+        
+        Args:
+            filepath: VM source (path or in-memory text stream), a directory or a list of VM sources
+            
+        Returns:
+            List of VM sources (directory contents are sorted by name)
+        """
+        if isinstance(filepath, (list, tuple)):
+            return list(filepath)
+        if is_stream(filepath):
+            return [filepath]
+        if os.path.isdir(filepath):
+            return sorted(
+                os.path.join(filepath, name) for name in os.listdir(filepath) if name.endswith('.vm')
+            )
+        return [filepath]
+
+    def translate(self, fetch_fragment=None):
         """
         Translate VM code to assembly
         
+        Every file is translated into its own assembly fragment (kept in
+        self.fragments); the bootstrap code is emitted once in front of them.
+        
+        Args:
+            fetch_fragment: Optional function (source, build) -> fragment text serving the
+                fragment of a file from a cache; build() translates the file
+        
         Returns:
             Assembly code as string
         """
         output = io.StringIO()
-        filename, ext = self.parse_filename(self.filepath)
-        if not (filename or filename[0].isupper() or ext != 'vm'):
-            print(f'Invalid filename format: {filename}.{ext}')
-            exit(1)
-        parser = VMParser(self.filepath)
-        writer = VMCodeEmitter(output)
-        writer.set_filename(filename)
-        
-        while parser.advance():
-            cmd_type = parser.command_type()
-            if cmd_type == C_ARITHMETIC:
-                writer.write_arithmetic(parser.current_command)
-            elif cmd_type == C_PUSH or cmd_type == C_POP:
-                writer.write_push_pop(cmd_type, parser.arg1(), parser.arg2())
-            elif cmd_type == C_LABEL:
-                writer.write_label(parser.arg1())
-            elif cmd_type == C_GOTO:
-                writer.write_goto(parser.arg1())
-            elif cmd_type == C_IF:
-                writer.write_if(parser.arg1())
-            elif cmd_type == C_FUNCTION:
-                writer.write_function(parser.arg1(), parser.arg2())
-            elif cmd_type == C_CALL:
-                writer.write_call(parser.arg1(), parser.arg2())
-            elif cmd_type == C_RETURN:
-                writer.write_return()
+        fragments = {}
+        for filepath, chunk in self._translate_chunks(fetch_fragment=fetch_fragment):
+            if filepath is not None:
+                fragments.setdefault(filepath, []).append(chunk)
+            output.write(chunk)
+        for filepath, chunks in fragments.items():
+            self.fragments[filepath] = ''.join(chunks)
         
         asm_code = output.getvalue()
         output.close()
+        if self.optimizer:
+            asm_code = self.optimizer.optimize_code(asm_code)
         return asm_code
+
+    def report(self):
+        """
+        Summarize the optimizations of the translation
+        
+        Returns:
+            Report lines, empty if nothing was optimized
+        """
+        lines = []
+        if self.shared_calls and self._saved_instructions is not None:
+            lines.append(self.shared_calls_report(self._emitted, self._saved_instructions))
+        if self.optimizer and self.optimizer.instructions_before:
+            lines.append(self.optimizer.report())
+        return '\n'.join(lines)
+
+    def translate_ir(self, fetch_fragment=None):
+        """
+        Translate VM code to assembler IR records
+        
+        The emitter writes its instructions into an asm_ir.IRBuffer as
+        (kind, text) records, so no assembly text is formatted, and an
+        in-process assembler encodes the records without tokenizing text.
+        Comments are dropped.
+        
+        Args:
+            fetch_fragment: Optional function (source, build) -> fragment text serving the
+                fragment of a file from a cache; build() translates the file, and its
+                records are cached as formatted text
+        
+        Returns:
+            List of assembler IR records
+        """
+        records = []
+        for _, chunk in self._translate_chunks(ir=True, fetch_fragment=fetch_fragment):
+            records.extend(chunk)
+        if self.optimizer:
+            records = self.optimizer.optimize(records)
+        return records
+
+    def translate_stream(self):
+        """
+        Translate VM code to a stream of assembler IR records
+        
+        Records of a RecordStream source are translated while the previous
+        step is still producing them. Fragments are not kept, and the peephole
+        optimizer (which needs the whole program) is not applied.
+        
+        Yields:
+            Assembler IR records of the bootstrap, then of each VM command
+        """
+        for _, chunk in self._translate_chunks(ir=True):
+            yield from chunk
+
+    def _translate_chunks(self, ir=False, fetch_fragment=None):
+        """
+        Translate every source, one VM command at a time
+        
+        Args:
+            ir: Produce lists of assembler IR records instead of assembly text
+            fetch_fragment: Optional function (source, build) -> fragment text; the
+                code of each file is then produced as one chunk
+        
+        Yields:
+            Tuples of (source, assembly code); source is None for code outside the files
+            
+        Raises:
+            ValueError: If a source is not a capitalized .vm file
+        """
+        chunk = asm_ir.IRBuffer() if ir else io.StringIO()
+        emitter = VMCachedTopEmitter if self.cache_top else VMCodeEmitter
+        writer = emitter(chunk, shared_calls=self.shared_calls, shared_compares=self.shared_compares)
+        self._emitted = 0
+        yield None, self._drain(chunk)
+        
+        for filepath in self.filepaths:
+            filename, ext = self.parse_filename(source_name(filepath))
+            basename = os.path.basename(filename)
+            if not basename or not basename[0].isupper() or ext != 'vm':
+                raise ValueError(f'Invalid filename format: {basename}.{ext} (expected a capitalized .vm file)')
+            if self.multi_file:
+                writer.start_fragment(filename)
+            else:
+                writer.set_filename(filename)
+            if fetch_fragment is None:
+                for code in self._translate_file(writer, chunk, filepath):
+                    yield filepath, code
+            else:
+                yield filepath, self._fetch_fragment(writer, chunk, filepath, fetch_fragment)
+        if self.shared_compares:
+            writer.write_comparison_routines()
+            yield None, self._drain(chunk)
+        
+        self._saved_instructions = writer.saved_instructions
+
+    def _translate_file(self, writer, chunk, filepath):
+        """
+        Translate the commands of one source
+        
+        Args:
+            writer: VMCodeEmitter writing to chunk
+            chunk: Buffer (text or asm_ir.IRBuffer) the writer writes to
+            filepath: VM source
+            
+        Yields:
+            Code of each VM command
+        """
+        commands = filepath if isinstance(filepath, RecordStream) else VMParser(filepath).commands
+        if self.inline_constants:
+            commands = self.fuse_constant_operands(commands, self.shared_compares)
+        if self.fuse_branches:
+            commands = self.fuse_compare_branches(commands)
+        for command in commands:
+            self._write_command(writer, command)
+            yield self._drain(chunk)
+        if self.cache_top:
+            # The next file starts with a jump target
+            writer.spill()
+            yield self._drain(chunk)
+
+    def _fetch_fragment(self, writer, chunk, filepath, fetch_fragment):
+        """
+        Get the code of one source from a cache, or translate it
+        
+        Args:
+            writer: VMCodeEmitter writing to chunk
+            chunk: Buffer (text or asm_ir.IRBuffer) the writer writes to
+            filepath: VM source
+            fetch_fragment: Function (source, build) -> fragment text
+            
+        Returns:
+            Fragment code (text, or a list of IR records for an IRBuffer)
+        """
+        ir = isinstance(chunk, asm_ir.IRBuffer)
+        built = None
+        
+        def build():
+            nonlocal built
+            codes = list(self._translate_file(writer, chunk, filepath))
+            built = [record for records in codes for record in records] if ir else ''.join(codes)
+            return asm_ir.format_records(built) if ir else built
+        
+        code = fetch_fragment(filepath, build)
+        if built is not None:
+            return built
+        # Served from the cache: the writer has not seen the file
+        writer.add_cached_fragment(code)
+        fragment = asm_ir.parse_text(code) if ir else code
+        if self.shared_calls:
+            self._emitted += self._count(fragment)
+        return fragment
+
+    def _drain(self, buffer):
+        """Take the code written to a buffer (text or IR records), count it and empty the buffer"""
+        if isinstance(buffer, asm_ir.IRBuffer):
+            code = buffer.drain()
+        else:
+            code = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if self.shared_calls:
+            self._emitted += self._count(code)
+        return code
+
+    @staticmethod
+    def _count(code):
+        """Count the A/C-instructions of assembly text or a list of IR records"""
+        if isinstance(code, str):
+            return VMCodeEmitter.count_instructions([code])
+        return sum(1 for kind, _ in code if kind != asm_ir.L_INSTRUCTION)
+
+    @classmethod
+    def fuse_constant_operands(cls, commands, shared_compares=False):
+        """
+        Merge constant pushes into the binary command consuming them
+        
+        'push constant k' (or 'push constant k; neg') directly followed by a
+        command that can apply the constant in place becomes one arithmetic
+        record carrying the constant as arg2. Other commands pass unchanged.
+        
+        Args:
+            commands: Iterable of (command, command_type, arg1, arg2) records
+            shared_compares: Comparisons go through the shared routines and are not fused
+            
+        Yields:
+            Command records, fused arithmetic records with the constant operand in arg2
+        """
+        pending = []
+        for command in commands:
+            text, cmd_type, arg1, arg2 = command
+            if cmd_type == C_PUSH and arg1 == 'constant':
+                yield from pending
+                pending = [command]
+                continue
+            if len(pending) == 1 and text == 'neg':
+                pending.append(command)
+                continue
+            if pending and cmd_type == C_ARITHMETIC:
+                value = -pending[0][3] if len(pending) == 2 else pending[0][3]
+                if arg1 in cls.CONSTANT_OPERAND_COMMANDS or (
+                        arg1 in VMCodeEmitter.COMPARISONS and not shared_compares
+                        and value in cls.CONSTANT_COMPARISON_VALUES):
+                    pending = []
+                    yield text, cmd_type, arg1, value
+                    continue
+            yield from pending
+            pending = []
+            yield command
+        yield from pending
+
+    @staticmethod
+    def fuse_compare_branches(commands):
+        """
+        Merge comparisons into the if-goto consuming them
+        
+        'eq'/'gt'/'lt' followed by any number of 'not' and an 'if-goto'
+        becomes one if-goto record whose arg2 is the (command, negated,
+        value) condition; value is the constant operand of a comparison
+        fused by fuse_constant_operands, or None.
+        
+        Args:
+            commands: Iterable of (command, command_type, arg1, arg2) records
+            
+        Yields:
+            Command records, fused if-goto records with the condition in arg2
+        """
+        pending = []
+        for command in commands:
+            text, cmd_type, arg1, arg2 = command
+            if cmd_type == C_ARITHMETIC and arg1 in VMCodeEmitter.COMPARISONS:
+                yield from pending
+                pending = [command]
+                continue
+            if pending and text == 'not':
+                pending.append(command)
+                continue
+            if pending and cmd_type == C_IF:
+                comparison, negated = pending[0], len(pending) % 2 == 0
+                pending = []
+                yield text, cmd_type, arg1, (comparison[2], negated, comparison[3])
+                continue
+            yield from pending
+            pending = []
+            yield command
+        yield from pending
+
+    @staticmethod
+    def _write_command(writer, command):
+        """
+        Emit the code of one VM command record
+        
+        Args:
+            writer: VMCodeEmitter to write to
+            command: (command, command_type, arg1, arg2) tuple; arithmetic records with
+                an arg2 have a constant second operand (see fuse_constant_operands), if-goto
+                records with an arg2 test a comparison (see fuse_compare_branches)
+        """
+        text, cmd_type, arg1, arg2 = command
+        if cmd_type == C_ARITHMETIC and arg2 is not None:
+            writer.write_constant_arithmetic(arg1, arg2)
+        elif cmd_type == C_ARITHMETIC:
+            writer.write_arithmetic(text)
+        elif cmd_type == C_PUSH or cmd_type == C_POP:
+            writer.write_push_pop(cmd_type, arg1, arg2)
+        elif cmd_type == C_LABEL:
+            writer.write_label(arg1)
+        elif cmd_type == C_GOTO:
+            writer.write_goto(arg1)
+        elif cmd_type == C_IF and arg2 is not None:
+            writer.write_compare_branch(arg1, *arg2)
+        elif cmd_type == C_IF:
+            writer.write_if(arg1)
+        elif cmd_type == C_FUNCTION:
+            writer.write_function(arg1, arg2)
+        elif cmd_type == C_CALL:
+            writer.write_call(arg1, arg2)
+        elif cmd_type == C_RETURN:
+            writer.write_return()
+
+    @staticmethod
+    def shared_calls_report(size, saved):
+        """
+        Summarize the code size saved by the shared call/return routines
+        
+        Args:
+            size: Number of instructions emitted
+            saved: Instructions saved against inlined call/return code
+            
+        Returns:
+            Report line
+        """
+        inline_size = size + saved
+        percent = 100 * saved / inline_size if inline_size else 0
+        return f'shared calls: {inline_size} -> {size} instructions ({percent:.1f}% smaller)'